@@ -0,0 +1,138 @@
+""" Solves many missionaries and cannibals instances in one process """
+import sys
+import json
+import argparse
+from collections import deque
+from functools import lru_cache
+
+from missionaries import (State, SEARCHES, action_sequence, is_valid_counts, np,
+                          same_problem, successor_table)
+
+# These modes always return a shortest path, so their queries are answered
+# from a cached shortest path tree instead of searching again
+SHORTEST_PATH_MODES = {"bfs", "bidir", "iddfs", "astar", "numpy"}
+
+@lru_cache(maxsize=16)
+def state_graph(missionaries, cannibals, capacity):
+    """ Maps every valid state's packed key to its (successor, action) pairs """
+    table = successor_table(missionaries, cannibals, capacity)
+    graph = {}
+    for key in range((missionaries + 1) * (cannibals + 1) * 2):
+        missionary_left, cannibal_left = divmod(key >> 1, cannibals + 1)
+        if is_valid_counts(missionary_left, cannibal_left,
+                           missionaries - missionary_left, cannibals - cannibal_left):
+            graph[key] = tuple(table.successors(key))
+    return graph
+
+@lru_cache(maxsize=256)
+def shortest_path_tree(missionaries, cannibals, capacity, goal):
+    """ Breadth-first search backwards from goal over the state graph. Maps
+    every state that can reach goal to (next state, action) on a shortest
+    path there. Crossings can always be undone, so the graph's edges work
+    in both directions. """
+    graph = state_graph(missionaries, cannibals, capacity)
+    tree = {goal: (None, None)}
+    frontier = deque([goal])
+    while frontier:
+        key = frontier.popleft()
+        for neighbour, action in graph[key]:
+            if neighbour not in tree:
+                tree[neighbour] = (key, action)
+                frontier.append(neighbour)
+    return tree
+
+def load_state(value):
+    """ States are given either inline, in the same format as the state
+    files, or as the name of a state file """
+    if "\n" in value:
+        return State.from_string(value)
+    return State.from_string(open(value).read())
+
+def read_manifest(lines, capacity=2):
+    """ Yields one query dict per line. Lines are either JSON objects with
+    start, goal, mode and optionally capacity keys, or the same values
+    separated by whitespace. Blank lines and lines starting with # are
+    skipped. """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            query = json.loads(line)
+        else:
+            fields = line.split()
+            query = dict(zip(("start", "goal", "mode", "capacity"), fields))
+        query.setdefault("capacity", capacity)
+        query["capacity"] = int(query["capacity"])
+        yield query
+
+def solve(query):
+    """ Answers one query, returning a JSON-serializable dict """
+    begin_state = load_state(query["start"])
+    goal_state = load_state(query["goal"])
+    mode = query["mode"]
+    capacity = query["capacity"]
+    answer = {"start": query["start"], "goal": query["goal"],
+              "mode": mode, "capacity": capacity}
+
+    if mode not in SEARCHES:
+        answer["error"] = "unknown mode {!r}".format(mode)
+        return answer
+    if mode == "numpy" and np is None:
+        answer["error"] = "the numpy mode needs numpy installed"
+        return answer
+
+    if mode in SHORTEST_PATH_MODES:
+        actions = None
+        if same_problem(begin_state, goal_state):
+            tree = shortest_path_tree(begin_state.missionaries, begin_state.cannibals,
+                                      capacity, goal_state.key)
+            if begin_state.key in tree:
+                actions = []
+                key, action = tree[begin_state.key]
+                while key is not None:
+                    actions.append(action)
+                    key, action = tree[key]
+        answer.update(source="tree", nodes_expanded=None)
+    else:
+        result = SEARCHES[mode](begin_state, goal_state, capacity)
+        actions = None
+        if result.node is not None:
+            actions = [action for action in action_sequence(result.node) if action]
+        answer.update(source="search", nodes_expanded=result.nodes_expanded,
+                      metrics=result.metrics.as_dict())
+
+    answer.update(solved=actions is not None,
+                  steps=None if actions is None else len(actions),
+                  actions=actions)
+    return answer
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Solves every missionaries and cannibals query in a manifest, "
+                    "writing one JSON result per line")
+    parser.add_argument("manifest", help="manifest or JSONL file, - for stdin")
+    parser.add_argument("output_file", nargs="?", help="defaults to stdout")
+    parser.add_argument("--capacity", type=int, default=2,
+                        help="boat capacity for queries that don't set one (default: 2)")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    manifest = sys.stdin if args.manifest == "-" else open(args.manifest)
+    output = open(args.output_file, "w") if args.output_file else sys.stdout
+
+    for query in read_manifest(manifest, args.capacity):
+        try:
+            answer = solve(query)
+        except (OSError, KeyError, ValueError, IndexError, ImportError) as error:
+            answer = dict(query, error=str(error))
+        output.write(json.dumps(answer) + "\n")
+        output.flush()
+
+    print("state graphs: {}".format(state_graph.cache_info()), file=sys.stderr)
+    print("shortest path trees: {}".format(shortest_path_tree.cache_info()), file=sys.stderr)
+
+# Prevent running if imported as a module
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+""" Benchmarks for the missionaries and cannibals search """
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+
+from missionaries import (State, Node, Boat, HEURISTICS, SEARCHES, SearchMetrics, astar,
+                          action_sequence, child_nodes, np, successor_table)
+from compare import timed_search
+
+TEST_CASES = [("tests/start{}.txt".format(i), "tests/goal{}.txt".format(i))
+              for i in (1, 2, 3)]
+
+def bytes_per_node(state, count=100000):
+    """ Average traced memory of a Node together with its State """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = [Node(State(state.missionary_left, state.cannibal_left,
+                        state.missionary_right, state.cannibal_right,
+                        state.boat_location), None, None)
+             for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Don't charge the list holding the nodes to the nodes themselves
+    return (after - before - sys.getsizeof(nodes)) / len(nodes)
+
+def expansions_per_second(begin_state, seconds=2.0):
+    """ Repeatedly floods the state space reachable from begin_state,
+    counting how many nodes child_nodes expands per second """
+    expanded = 0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < seconds:
+        frontier = [Node(begin_state, None, None)]
+        explored = {begin_state}
+        while frontier:
+            node = frontier.pop()
+            expanded += 1
+            for child in child_nodes(node):
+                if child.state not in explored:
+                    explored.add(child.state)
+                    frontier.append(child)
+
+    return expanded / (time.perf_counter() - start)
+
+def successor_expansions_per_second(begin_state, capacity=2, seconds=2.0):
+    """ Same flood as expansions_per_second, but on packed keys straight
+    from the successor table, without building any nodes """
+    table = successor_table(begin_state.missionaries, begin_state.cannibals, capacity)
+    expanded = 0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < seconds:
+        frontier = [begin_state.key]
+        explored = {begin_state.key}
+        while frontier:
+            key = frontier.pop()
+            expanded += 1
+            for child, _ in table.successors(key):
+                if child not in explored:
+                    explored.add(child)
+                    frontier.append(child)
+
+    return expanded / (time.perf_counter() - start)
+
+def compare_heuristics(test_cases, capacity=2, repeat=3):
+    """ Runs astar with every heuristic on every test case. Returns rows of
+    (test case, heuristic, steps, nodes expanded, heap pops, best seconds) """
+    rows = []
+    for start_filename, goal_filename in test_cases:
+        begin_state = State.from_string(open(start_filename).read())
+        goal_state = State.from_string(open(goal_filename).read())
+        for name in sorted(HEURISTICS):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = astar(begin_state, goal_state, capacity, name)
+                best = min(best, time.perf_counter() - start)
+
+            steps = 0
+            node = result.node
+            while node is not None and node.parent is not None:
+                steps += 1
+                node = node.parent
+            rows.append((start_filename, name, steps, result.nodes_expanded,
+                         result.metrics.counters.get("heap_pops"), best))
+    return rows
+
+def path_length(result):
+    if result.node is None:
+        return None
+    return len(action_sequence(result.node)) - 1
+
+def mismatches_with_bfs(mode, test_cases, capacity=2):
+    """ Returns the test cases where mode finds a different length of path
+    than bfs, which finds the shortest """
+    mismatches = []
+    for start_filename, goal_filename in test_cases:
+        begin_state = State.from_string(open(start_filename).read())
+        goal_state = State.from_string(open(goal_filename).read())
+        expected = path_length(SEARCHES["bfs"](begin_state, goal_state, capacity))
+        if path_length(SEARCHES[mode](begin_state, goal_state, capacity)) != expected:
+            mismatches.append(start_filename)
+    return mismatches
+
+def scaling_instance(missionaries):
+    """ Everyone starts on the right bank and has to cross to the left, with
+    a few fewer cannibals than missionaries so any boat of two or more can
+    do it, like tests/start3.txt """
+    cannibals = max(1, missionaries * 9 // 10)
+    if cannibals >= missionaries > 1:
+        cannibals = missionaries - 1
+    return (State(0, 0, missionaries, cannibals, Boat.RIGHT),
+            State(missionaries, cannibals, 0, 0, Boat.LEFT))
+
+def scaling_benchmark(modes, sizes, capacities, repeat=3, warmup=1, timeout=10):
+    """ Times every mode on every generated instance. Each measurement runs
+    warmup untimed searches, then repeat timed ones, then one more with
+    tracemalloc for peak memory. Returns one dict per measurement. """
+    rows = []
+    for mode in modes:
+        for capacity in capacities:
+            for missionaries in sizes:
+                begin_state, goal_state = scaling_instance(missionaries)
+                row = {"mode": mode, "missionaries": begin_state.missionaries,
+                       "cannibals": begin_state.cannibals, "capacity": capacity,
+                       "status": "timeout", "steps": None, "generated": None,
+                       "best": None, "median": None, "nodes_per_second": None,
+                       "peak_memory": None}
+                rows.append(row)
+
+                times = []
+                for run in range(warmup + repeat):
+                    result, seconds = timed_search(mode, begin_state, goal_state,
+                                                   capacity, timeout)
+                    if result is None:
+                        break
+                    if run >= warmup:
+                        times.append(seconds)
+                if len(times) < repeat:
+                    continue
+
+                metrics = SearchMetrics(trace_memory=True)
+                timed_search(mode, begin_state, goal_state, capacity, timeout, metrics)
+                row.update(status="solved" if result.node is not None else "no solution",
+                           steps=None if result.node is None
+                           else len(action_sequence(result.node)) - 1,
+                           generated=result.nodes_expanded,
+                           best=min(times), median=statistics.median(times),
+                           nodes_per_second=result.nodes_expanded / max(min(times), 1e-9),
+                           peak_memory=metrics.peak_memory)
+    return rows
+
+def baseline_key(row):
+    return "{mode}/{missionaries}/{cannibals}/{capacity}".format(**row)
+
+def slowdowns(rows, baseline, tolerance=0.25, slack=0.01):
+    """ Returns a message for every measurement more than tolerance slower
+    than its baseline best time, give or take slack seconds of noise, or
+    that timed out where the baseline finished """
+    messages = []
+    for row in rows:
+        expected = baseline.get(baseline_key(row))
+        if expected is None:
+            continue
+        if row["best"] is None:
+            messages.append("{}: timed out, baseline {:.4f}s".format(baseline_key(row), expected))
+        elif row["best"] > expected * (1 + tolerance) + slack:
+            messages.append("{}: {:.4f}s, baseline {:.4f}s".format(
+                baseline_key(row), row["best"], expected))
+    return messages
+
+def show(row, name, spec):
+    """ Formats row[name] for a table, or - if it wasn't measured """
+    return "-" if row[name] is None else format(row[name], spec)
+
+def scaling_table(rows):
+    lines = ["{:<6} {:>6} {:>6} {:>4} {:<12} {:>6} {:>10} {:>9} {:>9} {:>11} {:>9}".format(
+        "mode", "M", "C", "cap", "status", "steps", "generated",
+        "best s", "median s", "nodes/s", "peak KiB")]
+    for row in rows:
+        lines.append("{:<6} {:>6} {:>6} {:>4} {:<12} {:>6} {:>10} {:>9} {:>9} {:>11} {:>9}".format(
+            row["mode"], row["missionaries"], row["cannibals"], row["capacity"],
+            row["status"], show(row, "steps", "d"), show(row, "generated", "d"),
+            show(row, "best", ".4f"), show(row, "median", ".4f"),
+            show(row, "nodes_per_second", ".0f"),
+            "-" if row["peak_memory"] is None else row["peak_memory"] // 1024))
+    return "\n".join(lines)
+
+def micro_benchmark(filename):
+    begin_state = State.from_string(open(filename).read())
+
+    print("bytes per node:        {:.1f}".format(bytes_per_node(begin_state)))
+    print("expansions per second: {:.0f}".format(expansions_per_second(begin_state)))
+    for capacity in (2, 3, 5):
+        print("successor expansions per second, capacity {}: {:.0f}".format(
+            capacity, successor_expansions_per_second(begin_state, capacity)))
+
+    print()
+    print("{:<18} {:<10} {:>6} {:>9} {:>9} {:>10}".format(
+        "test case", "heuristic", "steps", "expanded", "heap pops", "seconds"))
+    for row in compare_heuristics(TEST_CASES):
+        print("{:<18} {:<10} {:>6} {:>9} {:>9} {:>10.4f}".format(*row))
+
+    print()
+    for mode in ("iddfs", "bidir", "numpy"):
+        if mode == "numpy" and np is None:
+            print("numpy: skipped, numpy is not installed")
+            continue
+        mismatches = mismatches_with_bfs(mode, TEST_CASES)
+        print("{}: {}".format(mode, "differs from bfs on " + ", ".join(mismatches)
+                                    if mismatches else "matches bfs"))
+
+def integers(value):
+    return [int(item) for item in value.split(",")]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks the missionaries searches")
+    commands = parser.add_subparsers(dest="command")
+
+    micro = commands.add_parser("micro", help="node size, expansion rate and heuristics "
+                                              "on the bundled tests (the default)")
+    micro.add_argument("filename", nargs="?", default="tests/start3.txt")
+
+    scaling = commands.add_parser("scaling", help="time every search on growing instances")
+    scaling.add_argument("--modes", default=",".join(sorted(
+        mode for mode in SEARCHES if mode != "numpy" or np is not None)))
+    scaling.add_argument("--sizes", type=integers, default=[10, 100, 1000],
+                         help="comma separated numbers of missionaries (default: 10,100,1000)")
+    scaling.add_argument("--capacities", type=integers, default=[2, 3, 5],
+                         help="comma separated boat capacities (default: 2,3,5)")
+    scaling.add_argument("--repeat", type=int, default=3)
+    scaling.add_argument("--warmup", type=int, default=1)
+    scaling.add_argument("--timeout", type=float, default=10,
+                         help="seconds before a single search is abandoned (default: 10)")
+    scaling.add_argument("--baseline", help="JSON file of best times to check against")
+    scaling.add_argument("--tolerance", type=float, default=0.25,
+                         help="allowed slowdown against the baseline (default: 0.25)")
+    scaling.add_argument("--slack", type=float, default=0.01,
+                         help="seconds of timing noise allowed on top of the tolerance "
+                              "(default: 0.01)")
+    scaling.add_argument("--save-baseline", help="write this run's best times here")
+    scaling.add_argument("--json", action="store_true",
+                         help="print the measurements as JSON instead of a table")
+
+    if not argv or argv[0] not in commands.choices and argv[0] not in ("-h", "--help"):
+        argv = ["micro"] + argv
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.command == "micro":
+        micro_benchmark(args.filename)
+        return
+
+    rows = scaling_benchmark(args.modes.split(","), args.sizes, args.capacities,
+                             args.repeat, args.warmup, args.timeout)
+    print(json.dumps(rows, indent=2) if args.json else scaling_table(rows))
+
+    if args.save_baseline:
+        baseline = {baseline_key(row): row["best"] for row in rows if row["best"] is not None}
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        messages = slowdowns(rows, json.load(open(args.baseline)),
+                             args.tolerance, args.slack)
+        if messages:
+            sys.exit("Slower than the baseline:\n" + "\n".join(messages))
+        print("No slowdowns against {}".format(args.baseline))
+
+# Prevent running if imported as a module
+if __name__ == "__main__":
+    main()
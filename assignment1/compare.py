@@ -0,0 +1,135 @@
+""" Runs every search on every instance, in parallel, and compares them """
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from missionaries import State, SEARCHES, SearchMetrics, action_sequence, np
+
+class SearchTimeout(Exception):
+    pass
+
+def raise_timeout(signum, frame):
+    raise SearchTimeout()
+
+def timed_search(mode, begin_state, goal_state, capacity=2, timeout=None, metrics=None):
+    """ Runs one search and returns (result, seconds), or (None, seconds) if
+    it ran past timeout seconds, where SIGALRM is available to stop it """
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    start = time.perf_counter()
+    try:
+        result = SEARCHES[mode](begin_state, goal_state, capacity, metrics=metrics)
+    except SearchTimeout:
+        result = None
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+    return result, time.perf_counter() - start
+
+def run_job(start_filename, goal_filename, mode, capacity=2, timeout=None, memory=False):
+    """ Runs one search and returns a small JSON-serializable summary of it,
+    rather than the Node chain, so it is cheap to send between processes.
+    Searches still running after timeout seconds are abandoned, where the
+    platform supports SIGALRM. Peak memory is only traced when memory is
+    set, since tracemalloc slows searches down several times over. """
+    begin_state = State.from_string(open(start_filename).read())
+    goal_state = State.from_string(open(goal_filename).read())
+    summary = {"instance": start_filename, "mode": mode, "capacity": capacity,
+               "status": "timeout", "steps": None, "actions": None,
+               "nodes_expanded": None, "seconds": None, "peak_memory": None,
+               "metrics": None}
+    metrics = SearchMetrics(trace_memory=memory)
+
+    result, seconds = timed_search(mode, begin_state, goal_state, capacity, timeout, metrics)
+    summary.update(seconds=seconds, peak_memory=metrics.peak_memory)
+    if result is None:
+        return summary
+
+    summary.update(nodes_expanded=result.nodes_expanded, metrics=metrics.as_dict())
+    if result.node is None:
+        summary["status"] = "no solution"
+    else:
+        actions = [action for action in action_sequence(result.node) if action]
+        summary.update(status="solved", steps=len(actions), actions=actions)
+    return summary
+
+def run_jobs(jobs, parallel, capacity=2, timeout=None, memory=False):
+    """ Runs (start_filename, goal_filename, mode) jobs over parallel worker
+    processes, or in this process when parallel is 1. Summaries come back
+    in the same order as jobs. """
+    if parallel <= 1:
+        return [run_job(start, goal, mode, capacity, timeout, memory)
+                for start, goal, mode in jobs]
+
+    with ProcessPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(run_job, start, goal, mode, capacity, timeout, memory)
+                   for start, goal, mode in jobs]
+        return [future.result() for future in futures]
+
+def comparison_table(summaries):
+    lines = ["{:<20} {:<6} {:<12} {:>6} {:>10} {:>9} {:>10}".format(
+        "instance", "mode", "status", "steps", "expanded", "seconds", "peak KiB")]
+    for summary in summaries:
+        lines.append("{:<20} {:<6} {:<12} {:>6} {:>10} {:>9.3f} {:>10}".format(
+            summary["instance"], summary["mode"], summary["status"],
+            "-" if summary["steps"] is None else summary["steps"],
+            "-" if summary["nodes_expanded"] is None else summary["nodes_expanded"],
+            summary["seconds"],
+            "-" if summary["peak_memory"] is None else summary["peak_memory"] // 1024))
+    return "\n".join(lines)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Compares the searches on pairs of start and goal state files")
+    parser.add_argument("files", nargs="*", metavar="start goal",
+                        help="start and goal state files, in pairs "
+                             "(default: the bundled test cases)")
+    parser.add_argument("--modes", default="bfs,dfs,iddfs,astar",
+                        help="comma separated searches to run (default: bfs,dfs,iddfs,astar)")
+    parser.add_argument("--parallel", type=int, default=os.cpu_count() or 1, metavar="N",
+                        help="worker processes to use (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="seconds before a single search is abandoned, 0 to never "
+                             "abandon one (default: 60)")
+    parser.add_argument("--capacity", type=int, default=2,
+                        help="most people the boat can carry at once (default: 2)")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace peak memory of each search, at the cost of speed")
+    parser.add_argument("--json", action="store_true",
+                        help="print the summaries as JSON instead of a table")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    files = args.files or ["tests/{}{}.txt".format(name, i)
+                           for i in (1, 2, 3) for name in ("start", "goal")]
+    if len(files) % 2:
+        sys.exit("Error: state files must come in start and goal pairs")
+
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in SEARCHES:
+            sys.exit("Error: unknown mode '{}'".format(mode))
+        if mode == "numpy" and np is None:
+            sys.exit("Error: the numpy mode needs numpy installed")
+
+    jobs = [(files[i], files[i + 1], mode)
+            for i in range(0, len(files), 2) for mode in modes]
+    summaries = run_jobs(jobs, args.parallel, args.capacity, args.timeout, args.memory)
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print(comparison_table(summaries))
+
+# Prevent running if imported as a module
+if __name__ == "__main__":
+    main()
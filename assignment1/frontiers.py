@@ -0,0 +1,152 @@
+""" Frontiers the missionaries and cannibals searches expand nodes from """
+from collections import deque
+from itertools import count
+
+class Frontier(object):
+    """Single-threaded FIFO or LIFO frontier with O(1) membership tests
+
+    Attributes:
+
+        lifo (bool): Pop the newest node instead of the oldest
+
+        nodes (deque): Nodes waiting to be expanded
+        keys (set): Packed keys of the states in nodes
+
+    """
+
+    __slots__ = ('lifo', 'nodes', 'keys')
+
+    def __init__(self, lifo=False):
+        self.lifo = lifo
+        self.nodes = deque()
+        self.keys = set()
+
+    def push(self, node):
+        self.nodes.append(node)
+        self.keys.add(node.state.key)
+
+    def pop(self):
+        node = self.nodes.pop() if self.lifo else self.nodes.popleft()
+        self.keys.discard(node.state.key)
+        return node
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.nodes)
+
+class IndexedHeap(object):
+    """Binary min-heap of nodes that supports decrease-key
+
+    Every state is in the heap at most once, and index tracks where, so a
+    better path to a queued state updates its entry in place instead of
+    leaving a stale duplicate behind. Ties on priority go to whichever
+    entry was pushed first.
+
+    Attributes:
+
+        heap (list): [priority, insertion order, node] entries
+        index (dict): Position in heap of each queued packed key
+
+        pushes (int): Entries added
+        pops (int): Entries removed
+        decreases (int): Entries whose priority was lowered in place
+        peak_size (int): Most entries held at once
+
+    """
+
+    __slots__ = ('heap', 'index', 'counter',
+                 'pushes', 'pops', 'decreases', 'peak_size')
+
+    def __init__(self):
+        self.heap = []
+        self.index = {}
+        self.counter = count()
+        self.pushes = 0
+        self.pops = 0
+        self.decreases = 0
+        self.peak_size = 0
+
+    def push(self, node, priority):
+        """ Queues node, or lowers the priority of its state if it is
+        already queued with a higher one. Returns whether anything changed. """
+        key = node.state.key
+        i = self.index.get(key)
+
+        if i is None:
+            self.heap.append([priority, next(self.counter), node])
+            self.index[key] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+            self.pushes += 1
+            self.peak_size = max(self.peak_size, len(self.heap))
+            return True
+
+        entry = self.heap[i]
+        if priority < entry[0]:
+            entry[0] = priority
+            entry[1] = next(self.counter)
+            entry[2] = node
+            self._sift_up(i)
+            self.decreases += 1
+            return True
+
+        return False
+
+    def pop(self):
+        """ Removes and returns the node with the lowest priority """
+        heap = self.heap
+        last = heap.pop()
+        if heap:
+            entry, heap[0] = heap[0], last
+            self.index[last[2].state.key] = 0
+            self._sift_down(0)
+        else:
+            entry = last
+
+        del self.index[entry[2].state.key]
+        self.pops += 1
+        return entry[2]
+
+    def metrics(self):
+        return {"heap_pushes": self.pushes,
+                "heap_pops": self.pops,
+                "heap_decreases": self.decreases,
+                "heap_peak_size": self.peak_size}
+
+    def _sift_up(self, i):
+        heap, index = self.heap, self.index
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent][:2] <= entry[:2]:
+                break
+            heap[i] = heap[parent]
+            index[heap[i][2].state.key] = i
+            i = parent
+        heap[i] = entry
+        index[entry[2].state.key] = i
+
+    def _sift_down(self, i):
+        heap, index = self.heap, self.index
+        size = len(heap)
+        entry = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1][:2] < heap[child][:2]:
+                child += 1
+            if entry[:2] <= heap[child][:2]:
+                break
+            heap[i] = heap[child]
+            index[heap[i][2].state.key] = i
+            i = child
+        heap[i] = entry
+        index[entry[2].state.key] = i
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.heap)
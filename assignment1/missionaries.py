@@ -1,5 +1,18 @@
 import sys
-import queue
+import json
+import time
+import argparse
+import tracemalloc
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+from frontiers import Frontier, IndexedHeap
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def enum(**enums):
     return type('Enum', (), enums)
@@ -7,32 +20,62 @@ def enum(**enums):
 """ Simple enumeration to represent the state of the boat """
 Boat = enum(LEFT=1, RIGHT=2)
 
+def pack_state(missionary_left, cannibal_left, boat_location, cannibals):
+    """ Packs the left bank and the boat into a single int. The right bank is
+    implied by the totals, so only the total number of cannibals is needed. """
+    return (((missionary_left * (cannibals + 1) + cannibal_left) << 1)
+            | (1 if boat_location == Boat.LEFT else 0))
+
+def unpack_state(key, cannibals):
+    """ Inverse of pack_state, returns (missionary_left, cannibal_left, boat_location) """
+    missionary_left, cannibal_left = divmod(key >> 1, cannibals + 1)
+    return (missionary_left, cannibal_left,
+            Boat.LEFT if key & 1 else Boat.RIGHT)
+
+def is_valid_counts(missionary_left, cannibal_left, missionary_right, cannibal_right):
+    return missionary_left >= 0 and missionary_right >= 0 \
+            and cannibal_left >= 0 and cannibal_right >= 0 \
+            and (missionary_left >= cannibal_left or missionary_left == 0) \
+            and (missionary_right >= cannibal_right or missionary_right == 0)
+
 class State(object):
     """Represents a state in the missionaries and cannibals problem
 
-    Attributes:
+    The totals never change during a search, so a state only stores them
+    alongside the left bank and boat, packed into one int by pack_state.
 
-        missionary_left (int): Number of missionaries on the left bank
-        cannibal_left (int): Number of cannibals on the left bank
+    Attributes:
 
-        missionary_right (int): Number of missionaries on the right bank
-        cannibal_right (int): Number of cannibals on the right bank
+        key (int): Packed (missionary_left, cannibal_left, boat_location)
 
-        boat_location (Enum): Whether boat is on the left or right bank
+        missionaries (int): Total number of missionaries
+        cannibals (int): Total number of cannibals
 
     """
 
+    __slots__ = ('key', 'missionaries', 'cannibals')
+
     # pylint: disable=too-many-arguments
     def __init__(self,
                  missionary_left, cannibal_left,
                  missionary_right, cannibal_right,
                  boat_location):
-        self.missionary_left = missionary_left
-        self.cannibal_left = cannibal_left
-        self.missionary_right = missionary_right
-        self.cannibal_right = cannibal_right
+        if min(missionary_left, cannibal_left, missionary_right, cannibal_right) < 0:
+            raise ValueError("A bank cannot hold a negative number of people")
 
-        self.boat_location = boat_location
+        self.missionaries = missionary_left + missionary_right
+        self.cannibals = cannibal_left + cannibal_right
+        self.key = pack_state(missionary_left, cannibal_left, boat_location,
+                              self.cannibals)
+
+    @staticmethod
+    def from_key(key, missionaries, cannibals):
+        """ Builds a state straight from its packed key, skipping validation """
+        state = State.__new__(State)
+        state.key = key
+        state.missionaries = missionaries
+        state.cannibals = cannibals
+        return state
 
     @staticmethod
     def from_string(data_string):
@@ -55,17 +98,37 @@ class State(object):
                      missionary_right, cannibal_right,
                      boat_location)
 
+    @property
+    def missionary_left(self):
+        return (self.key >> 1) // (self.cannibals + 1)
+
+    @property
+    def cannibal_left(self):
+        return (self.key >> 1) % (self.cannibals + 1)
+
+    @property
+    def missionary_right(self):
+        return self.missionaries - self.missionary_left
+
+    @property
+    def cannibal_right(self):
+        return self.cannibals - self.cannibal_left
+
+    @property
+    def boat_location(self):
+        return Boat.LEFT if self.key & 1 else Boat.RIGHT
+
     def is_valid(self):
-        return self.missionary_left >= 0 and self.missionary_right >= 0 \
-                and self.cannibal_left >= 0 and self.cannibal_right >= 0 \
-                and (self.missionary_left >= self.cannibal_left or self.missionary_left == 0) \
-                and (self.missionary_right >= self.cannibal_right or self.missionary_right == 0)
+        return is_valid_counts(self.missionary_left, self.cannibal_left,
+                               self.missionary_right, self.cannibal_right)
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return (self.key == other.key
+                and self.missionaries == other.missionaries
+                and self.cannibals == other.cannibals)
 
     def __hash__(self):
-        return hash(tuple(sorted(self.__dict__.items())))
+        return self.key
 
     def __repr__(self):
         return ("Left Bank: {} missionaries, ".format(self.missionary_left)
@@ -76,6 +139,8 @@ class State(object):
                 + "{} boat\n".format(1 if self.boat_location == Boat.RIGHT else 0))
 
 class Node(object):
+    __slots__ = ('state', 'parent', 'action', 'cost')
+
     def __init__(self, state, parent, action, cost=0):
         self.parent = parent
         self.state = state
@@ -97,186 +162,720 @@ class Node(object):
         return False
 
     def __hash__(self):
-        return self.state.__hash__()
+        return self.state.key
+
+NUMBER_WORDS = ("zero", "one", "two", "three", "four",
+                "five", "six", "seven", "eight", "nine", "ten")
 
-# Takes a state and returns the set of possible successor states
-def child_nodes(node):
+def describe_move(missionary_delta, cannibal_delta):
+    """ Human readable action for carrying the given people across """
+    def people(n, singular, plural):
+        word = NUMBER_WORDS[n] if n < len(NUMBER_WORDS) else str(n)
+        return "{} {}".format(word, singular if n == 1 else plural)
+
+    parts = []
+    if cannibal_delta:
+        parts.append(people(cannibal_delta, "cannibal", "cannibals"))
+    if missionary_delta:
+        parts.append(people(missionary_delta, "missionary", "missionaries"))
+    return "put {} in the boat".format(" ".join(parts))
+
+class SuccessorTable(object):
+    """Precomputed moves for one problem size
+
+    Every load the boat can carry is stored once as (missionary_delta,
+    cannibal_delta, key_delta, action), where key_delta is how much the
+    packed key changes when that load leaves the left bank. Successors are
+    then generated with a few additions and comparisons per move.
+
+    Attributes:
+
+        missionaries (int): Total number of missionaries
+        cannibals (int): Total number of cannibals
+        capacity (int): Most people the boat can carry at once
+
+        moves (tuple): Precomputed (missionary_delta, cannibal_delta,
+            key_delta, action) tuples
+
+    """
+
+    __slots__ = ('missionaries', 'cannibals', 'capacity', 'moves')
+
+    def __init__(self, missionaries, cannibals, capacity=2):
+        if capacity < 1:
+            raise ValueError("The boat must be able to carry someone")
+
+        self.missionaries = missionaries
+        self.cannibals = cannibals
+        self.capacity = capacity
+        self.moves = tuple(
+            (missionary_delta, cannibal_delta,
+             ((missionary_delta * (cannibals + 1) + cannibal_delta) << 1) | 1,
+             describe_move(missionary_delta, cannibal_delta))
+            for missionary_delta in range(capacity + 1)
+            for cannibal_delta in range(capacity + 1 - missionary_delta)
+            if missionary_delta + cannibal_delta > 0)
+
+    def successors(self, key):
+        """ Lazily yields (key, action) for every valid successor of key """
+        missionaries, cannibals = self.missionaries, self.cannibals
+        missionary_left, cannibal_left = divmod(key >> 1, cannibals + 1)
+
+        if key & 1:
+            # Boat is on the left bank, so the load leaves the left bank
+            for missionary_delta, cannibal_delta, key_delta, action in self.moves:
+                next_missionary_left = missionary_left - missionary_delta
+                next_cannibal_left = cannibal_left - cannibal_delta
+                if next_missionary_left < 0 or next_cannibal_left < 0:
+                    continue
+                if (next_missionary_left >= next_cannibal_left or next_missionary_left == 0) \
+                        and (missionaries - next_missionary_left >= cannibals - next_cannibal_left
+                             or next_missionary_left == missionaries):
+                    yield key - key_delta, action
+        else:
+            # Boat is on the right bank, so the load arrives on the left bank
+            for missionary_delta, cannibal_delta, key_delta, action in self.moves:
+                next_missionary_left = missionary_left + missionary_delta
+                next_cannibal_left = cannibal_left + cannibal_delta
+                if next_missionary_left > missionaries or next_cannibal_left > cannibals:
+                    continue
+                if (next_missionary_left >= next_cannibal_left or next_missionary_left == 0) \
+                        and (missionaries - next_missionary_left >= cannibals - next_cannibal_left
+                             or next_missionary_left == missionaries):
+                    yield key + key_delta, action
+
+    def predecessors(self, key):
+        """ Lazily yields (key, action) for every state that reaches key in
+        one crossing. The same people can always row straight back, so these
+        are the successors of key, and action also leads from them to key. """
+        return self.successors(key)
+
+    def node(self, key, parent, action, cost=0):
+        """ Wraps a packed key in a Node, for successors that are kept """
+        return Node(State.from_key(key, self.missionaries, self.cannibals),
+                    parent, action, cost)
+
+@lru_cache(maxsize=32)
+def successor_table(missionaries, cannibals, capacity=2):
+    return SuccessorTable(missionaries, cannibals, capacity)
+
+# Takes a node and returns the list of possible successor nodes
+def child_nodes(node, capacity=2):
     state = node.state
-    successors_set = set()
-
-    if state.boat_location == Boat.LEFT:
-        # Put one missionary in the boat
-        successor = State(state.missionary_left - 1, state.cannibal_left,
-                          state.missionary_right + 1, state.cannibal_right, Boat.RIGHT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put one missionary in the boat"))
-        # Put two missionaries in the boat
-        successor = State(state.missionary_left - 2, state.cannibal_left,
-                          state.missionary_right + 2, state.cannibal_right, Boat.RIGHT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put two missionaries in the boat"))
-        # Put one cannibal in the boat
-        successor = State(state.missionary_left, state.cannibal_left - 1,
-                          state.missionary_right, state.cannibal_right + 1, Boat.RIGHT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put one cannibal in the boat"))
-        # Put one cannibal and one missionary in the boat
-        successor = State(state.missionary_left - 1, state.cannibal_left - 1,
-                          state.missionary_right + 1, state.cannibal_right + 1, Boat.RIGHT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put one cannibal one missionary in the boat"))
-        # Put two cannibals in the boat
-        successor = State(state.missionary_left, state.cannibal_left - 2,
-                          state.missionary_right, state.cannibal_right + 2, Boat.RIGHT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put two cannibals in the boat"))
-
-    elif state.boat_location == Boat.RIGHT:
-        # Put one missionary in the boat
-        successor = State(state.missionary_left + 1, state.cannibal_left,
-                          state.missionary_right - 1, state.cannibal_right, Boat.LEFT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put one missionary in the boat"))
-        # Put two missionaries in the boat
-        successor = State(state.missionary_left + 2, state.cannibal_left,
-                          state.missionary_right - 2, state.cannibal_right, Boat.LEFT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put two missionaries in the boat"))
-        # Put one cannibal in the boat
-        successor = State(state.missionary_left, state.cannibal_left + 1,
-                          state.missionary_right, state.cannibal_right - 1, Boat.LEFT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put one cannibal in the boat"))
-        # Put one cannibal and one missionary in the boat
-        successor = State(state.missionary_left + 1, state.cannibal_left + 1,
-                          state.missionary_right - 1, state.cannibal_right - 1, Boat.LEFT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put one cannibal one missionary in the boat"))
-        # Put two cannibals in the boat
-        successor = State(state.missionary_left, state.cannibal_left + 2,
-                          state.missionary_right, state.cannibal_right - 2, Boat.LEFT)
-        if successor.is_valid():
-            successors_set.add(Node(successor,
-                                    node,
-                                    "put two cannibals in the boat"))
-
-    return successors_set
-
-def bfs(begin_state, goal_state):
-    if begin_state == goal_state:
-        return True
+    table = successor_table(state.missionaries, state.cannibals, capacity)
+    return [table.node(key, node, action)
+            for key, action in table.successors(state.key)]
 
-    frontier = queue.Queue()
-    frontier.put(Node(begin_state, None, None))
-    explored = set()
-    nodes_expanded = 0
+# Result of a search. node is None when the goal cannot be reached, and
+# metrics is the SearchMetrics the search recorded into.
+SearchResult = namedtuple('SearchResult', ['node', 'nodes_expanded', 'metrics'],
+                          defaults=(None,))
 
-    while frontier:
-        node = frontier.get()
-        explored.add(node)
-        children = child_nodes(node)
-        for child in children:
-            nodes_expanded += 1
-            if child not in explored:
-                if goal_state == child.state:
-                    # Done!
-                    return child, nodes_expanded
-                frontier.put(child)
+class SearchMetrics(object):
+    """Counters and timings recorded by a search
 
-def dfs(begin_state, goal_state):
-    if begin_state == goal_state:
-        return True
+    Attributes:
 
-    frontier = queue.LifoQueue()
-    frontier.put(Node(begin_state, None, None))
-    explored = set()
-    nodes_expanded = 0
+        generated (int): Successors generated, reported as nodes_expanded
+        expanded (int): States whose successors were generated
+        deduplicated (int): Successors dropped because their state had
+            already been reached
 
-    while frontier:
-        node = frontier.get()
-        explored.add(node)
-        children = child_nodes(node)
-        for child in children:
-            nodes_expanded += 1
-            if child not in explored:
-                if goal_state == child.state:
+        peak_frontier (int): Most states waiting to be expanded at once
+        peak_explored (int): Most states remembered as reached at once
+
+        phases (dict): Seconds spent in each phase of the search, by name
+        counters (dict): Extra counters kept by only some searches, by name
+
+        trace_memory (bool): Whether to trace memory with tracemalloc
+        peak_memory (int): Peak traced memory in bytes, if traced
+
+        hooks (list): Functions called as hook(key, depth) every time a
+            state is expanded
+
+    """
+
+    __slots__ = ('generated', 'expanded', 'deduplicated',
+                 'peak_frontier', 'peak_explored', 'phases', 'counters',
+                 'trace_memory', 'peak_memory', 'hooks')
+
+    def __init__(self, trace_memory=False, hooks=()):
+        self.generated = 0
+        self.expanded = 0
+        self.deduplicated = 0
+        self.peak_frontier = 0
+        self.peak_explored = 0
+        self.phases = {}
+        self.counters = {}
+        self.trace_memory = trace_memory
+        self.peak_memory = None
+        self.hooks = list(hooks)
+
+    @contextmanager
+    def phase(self, name):
+        """ Adds the time spent in the with block to the named phase """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def record(self, generated, expanded, deduplicated, peak_frontier, peak_explored):
+        """ Adds one search loop's counts. Searches keep them in locals while
+        they run, so recording costs nothing per node. """
+        self.generated += generated
+        self.expanded += expanded
+        self.deduplicated += deduplicated
+        self.peak_frontier = max(self.peak_frontier, peak_frontier)
+        self.peak_explored = max(self.peak_explored, peak_explored)
+
+    def as_dict(self):
+        return {"generated": self.generated,
+                "expanded": self.expanded,
+                "deduplicated": self.deduplicated,
+                "peak_frontier": self.peak_frontier,
+                "peak_explored": self.peak_explored,
+                "phases": dict(self.phases),
+                "counters": dict(self.counters),
+                "peak_memory": self.peak_memory}
+
+def instrumented(search):
+    """ Gives search a metrics keyword argument, defaulting to a fresh
+    SearchMetrics. Times the whole search, traces its memory if metrics
+    asks for it, and attaches metrics to the SearchResult returned. """
+    @wraps(search)
+    def run(begin_state, goal_state, *args, metrics=None, **kwargs):
+        if metrics is None:
+            metrics = SearchMetrics()
+
+        tracing = metrics.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            with metrics.phase("total"):
+                result = search(begin_state, goal_state, *args, metrics=metrics, **kwargs)
+        finally:
+            if tracing:
+                metrics.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        return result._replace(metrics=metrics)
+
+    return run
+
+def same_problem(begin_state, goal_state):
+    """ Searches only make sense between states with the same totals """
+    return (begin_state.missionaries == goal_state.missionaries
+            and begin_state.cannibals == goal_state.cannibals)
+
+def graph_search(begin_state, goal_state, frontier, capacity=2, metrics=None):
+    """ Search loop shared by bfs and dfs. Children already explored or
+    already waiting on the frontier are never enqueued again. """
+    begin_node = Node(begin_state, None, None)
+    if begin_state == goal_state:
+        return SearchResult(begin_node, 0)
+    if not same_problem(begin_state, goal_state):
+        return SearchResult(None, 0)
+
+    with metrics.phase("setup"):
+        table = successor_table(begin_state.missionaries, begin_state.cannibals, capacity)
+    goal = goal_state.key
+    hooks = metrics.hooks
+    frontier.push(begin_node)
+    explored = set()
+    generated = expanded = deduplicated = 0
+    peak_frontier = 1
+    found = None
+
+    with metrics.phase("search"):
+        while frontier and found is None:
+            node = frontier.pop()
+            explored.add(node.state.key)
+            expanded += 1
+            for hook in hooks:
+                hook(node.state.key, node.cost)
+
+            for key, action in table.successors(node.state.key):
+                generated += 1
+                if key in explored or key in frontier:
+                    deduplicated += 1
+                    continue
+                child = table.node(key, node, action, node.cost + 1)
+                if key == goal:
                     # Done!
-                    return child, nodes_expanded
-                frontier.put(child)
-
-def depth_limited_search(begin_state, goal_state, limit, nodes_expanded):
-    start_node = Node(begin_state, None, None)
-    return recursive_dls(start_node, goal_state, limit, nodes_expanded)
-
-def recursive_dls(node, goal_state, limit, nodes_expanded):
-    if node.state == goal_state:
-        return node
-    elif limit == 0:
-        return "cutoff"
-    else:
-        cutoff_occurred = False
-        for child in child_nodes(node):
-            nodes_expanded += 1
-            result = recursive_dls(child, goal_state, limit - 1, nodes_expanded)
-            if result == "cutoff":
+                    found = child
+                    break
+                frontier.push(child)
+            peak_frontier = max(peak_frontier, len(frontier))
+
+    metrics.record(generated, expanded, deduplicated, peak_frontier, len(explored))
+    return SearchResult(found, generated)
+
+@instrumented
+def bfs(begin_state, goal_state, capacity=2, metrics=None):
+    return graph_search(begin_state, goal_state, Frontier(), capacity, metrics)
+
+@instrumented
+def dfs(begin_state, goal_state, capacity=2, metrics=None):
+    return graph_search(begin_state, goal_state, Frontier(lifo=True), capacity, metrics)
+
+@instrumented
+def bidirectional_bfs(begin_state, goal_state, capacity=2, metrics=None):
+    """ Breadth-first search forwards from begin_state and backwards from
+    goal_state at the same time, one whole level of the smaller side at a
+    time, until the two meet. """
+    begin_node = Node(begin_state, None, None)
+    if begin_state == goal_state:
+        return SearchResult(begin_node, 0)
+    if not same_problem(begin_state, goal_state):
+        return SearchResult(None, 0)
+
+    with metrics.phase("setup"):
+        table = successor_table(begin_state.missionaries, begin_state.cannibals, capacity)
+
+    # Each side maps the states it reached to (neighbour, action). Forwards
+    # the neighbour is the state before, backwards it is the state after.
+    forward = {begin_state.key: (None, None)}
+    backward = {goal_state.key: (None, None)}
+    forward_level, backward_level = [begin_state.key], [goal_state.key]
+    forward_depth = backward_depth = 0
+    hooks = metrics.hooks
+    generated = expanded = deduplicated = 0
+    peak_frontier = 2
+    meeting = None
+
+    with metrics.phase("search"):
+        while forward_level and backward_level and meeting is None:
+            # Grow the side with the smaller level, or that has reached less so far
+            if (len(forward_level), len(forward)) <= (len(backward_level), len(backward)):
+                reached, other, level = forward, backward, forward_level
+                neighbours, depth = table.successors, forward_depth
+            else:
+                reached, other, level = backward, forward, backward_level
+                neighbours, depth = table.predecessors, backward_depth
+
+            # Finish the whole level, so the meeting point found is on a shortest path
+            next_level = []
+            for key in level:
+                expanded += 1
+                for hook in hooks:
+                    hook(key, depth)
+                for neighbour, action in neighbours(key):
+                    generated += 1
+                    if neighbour in reached:
+                        deduplicated += 1
+                        continue
+                    reached[neighbour] = (key, action)
+                    next_level.append(neighbour)
+                    if neighbour in other and meeting is None:
+                        meeting = neighbour
+
+            if reached is forward:
+                forward_level, forward_depth = next_level, forward_depth + 1
+            else:
+                backward_level, backward_depth = next_level, backward_depth + 1
+            peak_frontier = max(peak_frontier, len(forward_level) + len(backward_level))
+
+    metrics.record(generated, expanded, deduplicated, peak_frontier,
+                   len(forward) + len(backward))
+    metrics.counters.update(forward_reached=len(forward), backward_reached=len(backward))
+    if meeting is None:
+        return SearchResult(None, generated)
+
+    with metrics.phase("path"):
+        # Walk back from the meeting point to the start, then on to the goal
+        keys = []
+        actions = []
+        key = meeting
+        while key is not None:
+            keys.append(key)
+            key, action = forward[key]
+            actions.append(action)
+        keys.reverse()
+        actions.reverse()
+        key, action = backward[meeting]
+        while key is not None:
+            keys.append(key)
+            actions.append(action)
+            key, action = backward[key]
+
+        node = begin_node
+        for key, action in zip(keys[1:], actions[1:]):
+            node = table.node(key, node, action, node.cost + 1)
+    return SearchResult(node, generated)
+
+@lru_cache(maxsize=4)
+def transition_array(table):
+    """ Dense (states, moves) array of packed successor keys, -1 where a
+    move is not possible. Row i holds the successors of packed key i, and
+    column j is the move table.moves[j]. Needs numpy. """
+    missionaries, cannibals = table.missionaries, table.cannibals
+    keys = np.arange((missionaries + 1) * (cannibals + 1) * 2, dtype=np.int64)
+    missionary_left, cannibal_left = np.divmod(keys >> 1, cannibals + 1)
+    boat_left = (keys & 1).astype(bool)
+    # Moving the boat away from the left bank takes people off of it
+    sign = np.where(boat_left, -1, 1)
+
+    def valid(missionary_left, cannibal_left):
+        missionary_right = missionaries - missionary_left
+        cannibal_right = cannibals - cannibal_left
+        return ((missionary_left >= 0) & (cannibal_left >= 0)
+                & (missionary_right >= 0) & (cannibal_right >= 0)
+                & ((missionary_left >= cannibal_left) | (missionary_left == 0))
+                & ((missionary_right >= cannibal_right) | (missionary_right == 0)))
+
+    is_state = valid(missionary_left, cannibal_left)
+    transitions = np.full((len(keys), len(table.moves)), -1, dtype=np.int64)
+    for j, (missionary_delta, cannibal_delta, key_delta, _) in enumerate(table.moves):
+        possible = is_state & valid(missionary_left + sign * missionary_delta,
+                                    cannibal_left + sign * cannibal_delta)
+        transitions[possible, j] = keys[possible] + sign[possible] * key_delta
+    return transitions
+
+def vectorized_bfs_tree(table, begin, hooks=()):
+    """ Level-synchronous breadth-first search over every state at once.
+    Returns (distance, parent, parent_move, edges, peak_level), arrays
+    indexed by packed key where distance is -1 for states begin cannot
+    reach, parent and parent_move give the previous state and the index of
+    the move in table.moves, edges counts the transitions followed and
+    peak_level is the size of the largest level. Needs numpy. """
+    transitions = transition_array(table)
+    state_count = len(transitions)
+    distance = np.full(state_count, -1, dtype=np.int64)
+    parent = np.full(state_count, -1, dtype=np.int64)
+    parent_move = np.full(state_count, -1, dtype=np.int64)
+    visited = np.zeros(state_count, dtype=bool)
+
+    # The frontier is kept as an array of keys rather than a mask over every
+    # state, so each level costs time in its own size and not the whole space
+    distance[begin] = 0
+    visited[begin] = True
+    frontier = np.array([begin], dtype=np.int64)
+    level = 0
+    edges = 0
+    peak_level = 1
+
+    while len(frontier):
+        for hook in hooks:
+            for key in frontier.tolist():
+                hook(key, level)
+
+        reached = []
+        for j in range(transitions.shape[1]):
+            targets = transitions[frontier, j]
+            possible = targets >= 0
+            edges += int(possible.sum())
+            targets, origins = targets[possible], frontier[possible]
+            new = ~visited[targets]
+            targets, origins = targets[new], origins[new]
+            visited[targets] = True
+            distance[targets] = level + 1
+            parent[targets] = origins
+            parent_move[targets] = j
+            reached.append(targets)
+        frontier = np.concatenate(reached)
+        peak_level = max(peak_level, len(frontier))
+        level += 1
+
+    return distance, parent, parent_move, edges, peak_level
+
+@instrumented
+def numpy_bfs(begin_state, goal_state, capacity=2, metrics=None):
+    """ Shortest path read off vectorized_bfs_tree """
+    if np is None:
+        raise ImportError("the numpy mode needs numpy installed")
+    if not same_problem(begin_state, goal_state):
+        return SearchResult(None, 0)
+
+    with metrics.phase("setup"):
+        table = successor_table(begin_state.missionaries, begin_state.cannibals, capacity)
+        transition_array(table)
+    with metrics.phase("search"):
+        distance, parent, parent_move, edges, peak_level = vectorized_bfs_tree(
+            table, begin_state.key, metrics.hooks)
+
+    states_reached = int((distance >= 0).sum())
+    metrics.record(edges, states_reached, edges - states_reached + 1,
+                   peak_level, states_reached)
+    metrics.counters["levels"] = int(distance.max()) + 1
+    if distance[goal_state.key] < 0:
+        return SearchResult(None, edges)
+
+    with metrics.phase("path"):
+        keys = [goal_state.key]
+        while keys[-1] != begin_state.key:
+            keys.append(int(parent[keys[-1]]))
+        keys.reverse()
+
+        node = Node(begin_state, None, None)
+        for key in keys[1:]:
+            action = table.moves[parent_move[key]][3]
+            node = table.node(key, node, action, node.cost + 1)
+    return SearchResult(node, edges)
+
+def depth_limited_search(begin_state, goal_state, limit, capacity=2, lower_bounds=None,
+                         metrics=None):
+    """ Depth-first search down to limit crossings, on an explicit stack.
+
+    Skips states already on the current path, states this search already
+    reached at the same depth or shallower, and states whose entry in
+    lower_bounds (crossings known to be needed to reach the goal) puts the
+    goal out of reach. Returns (result, nodes_expanded, shallowest), where
+    result is the goal Node, "cutoff" if the limit cut the search short or
+    None, and shallowest maps every state reached to the shallowest depth
+    it was reached at. """
+    if lower_bounds is None:
+        lower_bounds = {}
+    if metrics is None:
+        metrics = SearchMetrics()
+
+    table = successor_table(begin_state.missionaries, begin_state.cannibals, capacity)
+    begin, goal = begin_state.key, goal_state.key
+    shallowest = {begin: 0}
+    hooks = metrics.hooks
+    generated = expanded = deduplicated = 0
+    peak_frontier = 1
+    cutoff_occurred = False
+    found = None
+
+    if begin == goal:
+        return Node(begin_state, None, None), generated, shallowest
+    if lower_bounds.get(begin, 0) > limit:
+        return "cutoff", generated, shallowest
+
+    # Each frame is (key, action that reached it, successors left to try).
+    # Children of the top frame are at depth len(stack).
+    stack = [(begin, None, table.successors(begin))]
+    path = {begin}
+    expanded += 1
+    for hook in hooks:
+        hook(begin, 0)
+
+    while stack and found is None:
+        key, _, successors = stack[-1]
+        depth = len(stack)
+        if depth > limit:
+            cutoff_occurred = True
+            stack.pop()
+            path.discard(key)
+            continue
+
+        for child, action in successors:
+            generated += 1
+            if child in path or shallowest.get(child, limit + 1) <= depth:
+                deduplicated += 1
+                continue
+            shallowest[child] = depth
+
+            if child == goal:
+                # Done! The stack holds the path that got here.
+                node = Node(begin_state, None, None)
+                for frame_key, frame_action, _ in stack[1:]:
+                    node = table.node(frame_key, node, frame_action, node.cost + 1)
+                found = table.node(child, node, action, node.cost + 1)
+                break
+
+            if depth + lower_bounds.get(child, 0) > limit:
                 cutoff_occurred = True
-            elif result:
-                # Done!
-                return result
-        if cutoff_occurred:
-            return "cutoff"
+                continue
+
+            stack.append((child, action, table.successors(child)))
+            path.add(child)
+            expanded += 1
+            if hooks:
+                for hook in hooks:
+                    hook(child, depth)
+            if depth >= peak_frontier:
+                peak_frontier = depth + 1
+            break
         else:
-            return False
-
-def iddfs(begin_state, goal_state):
+            stack.pop()
+            path.discard(key)
+
+    metrics.record(generated, expanded, deduplicated, peak_frontier, len(shallowest))
+    if found is not None:
+        return found, generated, shallowest
+    return ("cutoff" if cutoff_occurred else None), generated, shallowest
+
+@instrumented
+def iddfs(begin_state, goal_state, capacity=2, metrics=None):
+    """ Runs depth_limited_search with limits 0, 1, 2, ... and keeps a lower
+    bound on the crossings each state needs across iterations. When a whole
+    iteration fails, no state reached at depth g can reach the goal within
+    limit - g crossings, so later iterations prune them sooner. """
     nodes_expanded = 0
-    for depth in range(sys.maxsize**10):
-        result = depth_limited_search(begin_state, goal_state, depth, nodes_expanded)
+    lower_bounds = {}
+    if not same_problem(begin_state, goal_state):
+        return SearchResult(None, nodes_expanded)
+
+    # Shortest paths never repeat a state, so none is longer than this
+    state_count = (begin_state.missionaries + 1) * (begin_state.cannibals + 1) * 2
+
+    for depth in range(state_count):
+        with metrics.phase("search"):
+            result, expanded, shallowest = depth_limited_search(
+                begin_state, goal_state, depth, capacity, lower_bounds, metrics)
+        nodes_expanded += expanded
+        metrics.counters.update(iterations=depth + 1, transpositions=len(lower_bounds))
         if result != "cutoff":
-            return result, nodes_expanded
+            return SearchResult(result, nodes_expanded)
+
+        with metrics.phase("transpositions"):
+            for key, reached in shallowest.items():
+                bound = depth - reached + 1
+                if lower_bounds.get(key, 0) < bound:
+                    lower_bounds[key] = bound
+
+    metrics.counters["transpositions"] = len(lower_bounds)
+    return SearchResult(None, nodes_expanded)
 
 # Lower score is closer to solution
 def score(current_state, goal_state):
     return ((goal_state.missionary_left - current_state.missionary_left) +
             (goal_state.cannibal_left - current_state.cannibal_left))
 
-def astar(begin_state, goal_state):
-    if begin_state == goal_state:
-        return True
-    begin_node = Node(begin_state, None, None)
-    frontier = queue.PriorityQueue()
-    frontier.put((score(begin_node.state, goal_state), begin_node))
-    explored = set()
-    nodes_expanded = 0
+# Heuristics for astar. Each one takes the successor table and the packed
+# goal key, and returns a function estimating the crossings left from a key.
+
+def zero_heuristic(table, goal):
+    """ Turns astar into uniform cost search """
+    return lambda key: 0
+
+def score_heuristic(table, goal):
+    """ The original score. Can be negative and overestimate, so paths
+    found with it are not guaranteed to be optimal. """
+    goal_state = State.from_key(goal, table.missionaries, table.cannibals)
+    return lambda key: score(State.from_key(key, table.missionaries, table.cannibals),
+                             goal_state)
+
+def people_to_move(table, goal):
+    """ Returns a function giving how many more people must end up on the
+    left bank to match goal, negative if people must leave it instead """
+    goal_missionary_left, goal_cannibal_left = divmod(goal >> 1, table.cannibals + 1)
+    goal_people_left = goal_missionary_left + goal_cannibal_left
+
+    def remaining(key):
+        missionary_left, cannibal_left = divmod(key >> 1, table.cannibals + 1)
+        return goal_people_left - missionary_left - cannibal_left
+
+    return remaining
+
+def crossings_heuristic(table, goal):
+    """ Each crossing moves at most capacity people """
+    remaining = people_to_move(table, goal)
+    capacity = table.capacity
+    return lambda key: -(-abs(remaining(key)) // capacity)
+
+def capacity_heuristic(table, goal):
+    """ Someone has to row the boat back, so each round trip moves at most
+    capacity - 1 people. Also accounts for which bank the boat starts and
+    has to end on, which fixes whether the number of crossings is odd. """
+    remaining = people_to_move(table, goal)
+    capacity = table.capacity
+    goal_boat = goal & 1
+
+    def h(key):
+        people = remaining(key)
+        if capacity == 1:
+            return abs(people)
+        if key & 1 == goal_boat:
+            # Even number of crossings, half of them each way
+            return 2 * -(-abs(people) // (capacity - 1))
+        if people == 0:
+            # One crossing would leave a bank short, so at least three
+            return 3
+        # Odd number of crossings. The boat is on the bank people have to
+        # leave when it is on the right and people have to reach the left.
+        if (people > 0) == (not key & 1):
+            round_trips = max(0, -(-(abs(people) - capacity) // (capacity - 1)))
+        else:
+            round_trips = -(-(abs(people) + 1) // (capacity - 1))
+        return 2 * round_trips + 1
+
+    return h
 
+@lru_cache(maxsize=32)
+def pattern_database(table, goal):
+    """ Exact number of crossings from every state that can reach goal,
+    found with one breadth-first search backwards from goal. """
+    distances = {goal: 0}
+    frontier = deque([goal])
     while frontier:
-        node = frontier.get()[1]
-        explored.add(node)
-        for child in child_nodes(node):
-            nodes_expanded += 1
-            if child not in explored:
-                if goal_state == child.state:
-                    # Done!
-                    return child, nodes_expanded
-                frontier.put((score(child.state, goal_state), child))
+        key = frontier.popleft()
+        distance = distances[key] + 1
+        for parent, _ in table.predecessors(key):
+            if parent not in distances:
+                distances[parent] = distance
+                frontier.append(parent)
+    return distances
+
+def pattern_database_heuristic(table, goal):
+    """ Exact, states that cannot reach the goal are infinitely far away """
+    distances = pattern_database(table, goal)
+    return lambda key: distances.get(key, float("inf"))
+
+HEURISTICS = {
+    "zero": zero_heuristic,
+    "score": score_heuristic,
+    "crossings": crossings_heuristic,
+    "capacity": capacity_heuristic,
+    "pdb": pattern_database_heuristic,
+}
+
+@instrumented
+def astar(begin_state, goal_state, capacity=2, heuristic="capacity", metrics=None):
+    """ A* over path cost g (one per crossing) plus heuristic as h. Each state
+    is expanded at most once, and queued states keep only their cheapest path.
+    heuristic is either a name in HEURISTICS or a function with the same
+    signature as the ones in it. """
+    begin_node = Node(begin_state, None, None)
+    if not same_problem(begin_state, goal_state):
+        return SearchResult(None, 0)
+
+    with metrics.phase("setup"):
+        table = successor_table(begin_state.missionaries, begin_state.cannibals, capacity)
+        goal = goal_state.key
+        if not callable(heuristic):
+            heuristic = HEURISTICS[heuristic]
+        h = heuristic(table, goal)
+
+    # Priorities are (f, h), so among equal f the state estimated to be
+    # closest to the goal goes first
+    frontier = IndexedHeap()
+    estimate = h(begin_state.key)
+    frontier.push(begin_node, (estimate, estimate))
+    explored = set()
+    hooks = metrics.hooks
+    generated = expanded = deduplicated = 0
+    found = None
+
+    with metrics.phase("search"):
+        while frontier:
+            node = frontier.pop()
+            if node.state.key == goal:
+                # Done!
+                found = node
+                break
+
+            explored.add(node.state.key)
+            expanded += 1
+            for hook in hooks:
+                hook(node.state.key, node.cost)
+
+            cost = node.cost + 1
+            for key, action in table.successors(node.state.key):
+                generated += 1
+                if key in explored:
+                    deduplicated += 1
+                    continue
+                child = table.node(key, node, action, cost)
+                estimate = h(key)
+                if not frontier.push(child, (cost + estimate, estimate)):
+                    deduplicated += 1
+
+    metrics.record(generated, expanded, deduplicated, frontier.peak_size, len(explored))
+    metrics.counters.update(frontier.metrics())
+    return SearchResult(found, generated)
 
 def action_sequence(node):
     actions = []
@@ -287,34 +886,74 @@ def action_sequence(node):
 
 def action_sequence_string(result):
     actions_string = ""
-    for action in action_sequence(result[0]):
-        if action:
-            actions_string += (action + "\n")
-    actions_string += "done in {} steps!\n".format(len(action_sequence(result[0])))
+    if result[0] is None:
+        actions_string += "no solution found!\n"
+    else:
+        for action in action_sequence(result[0]):
+            if action:
+                actions_string += (action + "\n")
+        actions_string += "done in {} steps!\n".format(len(action_sequence(result[0])))
     actions_string += "{} nodes were expanded".format(result[1])
     return actions_string
 
+def metrics_json(result, mode):
+    """ Machine readable summary of a search, to go with action_sequence_string """
+    steps = None if result.node is None else len(action_sequence(result.node)) - 1
+    report = {"mode": mode, "solved": result.node is not None, "steps": steps,
+              "nodes_expanded": result.nodes_expanded}
+    if result.metrics is not None:
+        report.update(result.metrics.as_dict())
+    return json.dumps(report)
+
+SEARCHES = {
+    "bfs": bfs,
+    "dfs": dfs,
+    "iddfs": iddfs,
+    "astar": astar,
+    "bidir": bidirectional_bfs,
+    "numpy": numpy_bfs,
+}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Solves the missionaries and cannibals problem")
+    parser.add_argument("initial_state_filename")
+    parser.add_argument("goal_state_filename")
+    parser.add_argument("mode", choices=sorted(SEARCHES))
+    parser.add_argument("output_file", nargs="?")
+    parser.add_argument("--capacity", type=int, default=2,
+                        help="most people the boat can carry at once (default: 2)")
+    parser.add_argument("--heuristic", choices=sorted(HEURISTICS), default="capacity",
+                        help="heuristic used by astar (default: capacity)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="print the search's metrics as JSON after its actions")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="trace peak memory with tracemalloc, which slows searches down")
+    return parser.parse_args(argv)
+
 def main():
-    if len(sys.argv) >= 4:
-        begin_state = State.from_string(open(sys.argv[1]).read())
-        goal_state = State.from_string(open(sys.argv[2]).read())
-        mode = sys.argv[3]
-
-        if mode == "bfs":
-            result = bfs(begin_state, goal_state)
-        elif mode == "dfs":
-            result = dfs(begin_state, goal_state)
-        elif mode == "iddfs":
-            result = iddfs(begin_state, goal_state)
-        elif mode == "astar":
-            result = astar(begin_state, goal_state)
+    args = parse_args(sys.argv[1:])
+    begin_state = State.from_string(open(args.initial_state_filename).read())
+    goal_state = State.from_string(open(args.goal_state_filename).read())
+
+    metrics = SearchMetrics(trace_memory=args.trace_memory)
+
+    try:
+        if args.mode == "astar":
+            result = astar(begin_state, goal_state, args.capacity, args.heuristic,
+                           metrics=metrics)
         else:
-            sys.exit("Error: mode argument must be either 'bfs', 'dfs', 'iddfs' or 'astar'")
+            result = SEARCHES[args.mode](begin_state, goal_state, args.capacity,
+                                         metrics=metrics)
+    except ImportError as error:
+        sys.exit("Error: {}".format(error))
 
-        if len(sys.argv) >= 5:
-            open(sys.argv[4], "w").write(action_sequence_string(result))
+    if args.output_file:
+        open(args.output_file, "w").write(action_sequence_string(result))
 
-        print(action_sequence_string(result))
+    print(action_sequence_string(result))
+    if args.metrics:
+        print(metrics_json(result, args.mode))
 
 # Prevent running if imported as a module
 if __name__ == "__main__":
@@ -0,0 +1,381 @@
+""" Benchmarks for the reversi search """
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+from bitboard import bitboard_after, bitboard_moves, bit_indices
+from reversi import (EMPTY_SQUARE, Player, IllegalMoveError, bitboards, bitboard_minimax,
+                     create_board, deltas, find_bracket, make_flips, make_move, opponent,
+                     valid_moves)
+from search import AlphaBeta, RootSplit, EndgameSolver
+
+def list_valid_moves(player, board):
+    """ valid_moves the way it was written before bitboards, on
+    find_bracket """
+    moves = set()
+    for p in [i for i, piece in enumerate(board) if piece == player]:
+        moves |= {find_bracket(p, player, d, board) for d in deltas(board)}
+    return moves
+
+def list_make_move(player, i, board):
+    """ make_move the way it was written before bitboards, on make_flips.
+    Returns None for an illegal move. """
+    if i not in list_valid_moves(player, board):
+        return None
+    board = list(board)
+    for d in deltas(board):
+        board = make_flips(i, player, d, board)
+    return board
+
+def random_boards(sizes, count, seed=0):
+    """ Yields count (player, board) pairs from random games on boards of
+    the given sizes. Some games get pieces scattered at random over them
+    first, to reach positions real games don't. """
+    rng = random.Random(seed)
+    while True:
+        size = rng.choice(sizes)
+        board = create_board(size)
+        if rng.random() < 0.3:
+            for _ in range(rng.randint(1, 2 * size)):
+                board[rng.randrange(size**2)] = rng.choice((Player.ONE, Player.TWO, EMPTY_SQUARE))
+        player = Player.ONE
+        for _ in range(size**2):
+            if count == 0:
+                return
+            count -= 1
+            yield player, board
+            moves = [i for i in valid_moves(player, board) if i is not None]
+            if moves:
+                board = make_move(player, *divmod(rng.choice(moves), size)[::-1], board)
+            player = opponent(player)
+
+def compare_moves(boards):
+    """ Checks valid_moves and make_move, for every square, against the list
+    based versions. Returns (positions, moves checked, positions where the
+    move sets differ, moves where the boards differ, list based seconds,
+    bitboard seconds). """
+    positions = checked = set_differ = move_differ = 0
+    list_seconds = bitboard_seconds = 0
+    for player, board in boards:
+        positions += 1
+        start = time.perf_counter()
+        expected = [list_valid_moves(player, board)]
+        expected += [list_make_move(player, i, board) for i in range(len(board))]
+        list_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [valid_moves(player, board)]
+        size = int(len(board) ** 0.5)
+        for i in range(len(board)):
+            try:
+                results.append(make_move(player, i % size, i // size, board))
+            except IllegalMoveError:
+                results.append(None)
+        bitboard_seconds += time.perf_counter() - start
+
+        set_differ += results[0] != expected[0]
+        move_differ += sum(a != b for a, b in zip(results[1:], expected[1:]))
+        checked += len(board)
+    return positions, checked, set_differ, move_differ, list_seconds, bitboard_seconds
+
+def midgame_positions(size, count, plies, seed=0):
+    """ Plays random games from the starting position and returns count of
+    the (own, opponent) positions reached after plies moves, skipping
+    games that end sooner """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        own, opp = bitboards(Player.ONE, create_board(size))
+        for _ in range(plies):
+            moves = list(bit_indices(bitboard_moves(own, opp, size)))
+            if not moves:
+                break
+            own, opp = bitboard_after(rng.choice(moves), own, opp, size)
+        else:
+            positions.append((own, opp))
+    return positions
+
+def minimax_nodes(own, opp, size, depth):
+    """ Number of positions bitboard_minimax visits """
+    moves = bitboard_moves(own, opp, size)
+    if depth == 0 or not moves:
+        return 1
+    return 1 + sum(minimax_nodes(*bitboard_after(i, own, opp, size), size, depth - 1)
+                   for i in bit_indices(moves))
+
+def compare_pruning(positions, size, depths):
+    """ Searches every position with minimax and alpha-beta at every depth.
+    Returns rows of (depth, minimax nodes, alpha-beta nodes, minimax
+    seconds, alpha-beta seconds, positions where the moves differ). """
+    rows = []
+    for depth in depths:
+        full = pruned = full_seconds = pruned_seconds = differ = 0
+        for own, opp in positions:
+            full += minimax_nodes(own, opp, size, depth)
+            start = time.perf_counter()
+            expected = bitboard_minimax(own, opp, size, depth)
+            full_seconds += time.perf_counter() - start
+
+            search = AlphaBeta(size)
+            start = time.perf_counter()
+            result = search.best_move(own, opp, depth)
+            pruned_seconds += time.perf_counter() - start
+            pruned += search.nodes
+            differ += result != expected
+        rows.append((depth, full, pruned, full_seconds, pruned_seconds, differ))
+    return rows
+
+def compare_table_sizes(positions, size, depth, table_sizes):
+    """ Searches every position with alpha-beta once per table size, with
+    a fresh search for each position. Returns one row of totals per table
+    size: nodes, seconds, positions whose result differs from searching
+    without a table, and the table's stats summed over positions. """
+    expected = [AlphaBeta(size, table_size=0).best_move(own, opp, depth)
+                for own, opp in positions]
+    rows = []
+    for table_size in table_sizes:
+        nodes = seconds = differ = 0
+        stats = {}
+        for (own, opp), result in zip(positions, expected):
+            search = AlphaBeta(size, table_size)
+            start = time.perf_counter()
+            differ += search.best_move(own, opp, depth) != result
+            seconds += time.perf_counter() - start
+            nodes += search.nodes
+            if search.table is not None:
+                for name, value in search.table.stats().items():
+                    stats[name] = stats.get(name, 0) + value
+        if stats:
+            stats["hit_rate"] = stats["hits"] / stats["probes"] if stats["probes"] else 0.0
+            stats["used"] //= len(positions)
+            stats["bytes"] //= len(positions)
+            stats["size"] = table_size
+        rows.append({"table_size": table_size, "nodes": nodes, "seconds": seconds,
+                     "differ": differ, "stats": stats})
+    return rows
+
+def move_latency(size, budgets, phases, count, seed=0):
+    """ Runs a time-budgeted iterative deepening search on count positions
+    from each phase, a number of random plies into the game, with each
+    budget. Returns rows of (plies, budget, depths reached, seconds taken). """
+    rows = []
+    for plies in phases:
+        positions = midgame_positions(size, count, plies, seed)
+        for budget in budgets:
+            depths, seconds = [], []
+            for own, opp in positions:
+                start = time.perf_counter()
+                depths.append(AlphaBeta(size).iterative_deepening(own, opp, budget)[2])
+                seconds.append(time.perf_counter() - start)
+            rows.append((plies, budget, depths, seconds))
+    return rows
+
+def parallel_speedup(positions, size, depth, worker_counts):
+    """ Searches every position serially and then with RootSplit over each
+    number of workers. Returns rows of (workers, seconds, nodes, positions
+    where the result differs from the serial search); workers 1 is the
+    serial search. """
+    expected, seconds, nodes = [], 0, 0
+    for own, opp in positions:
+        search = AlphaBeta(size)
+        start = time.perf_counter()
+        expected.append(search.best_move(own, opp, depth))
+        seconds += time.perf_counter() - start
+        nodes += search.nodes
+    rows = [(1, seconds, nodes, 0)]
+
+    for workers in worker_counts:
+        if workers == 1:
+            continue
+        with RootSplit(size, workers) as search:
+            # Start the worker processes before timing anything
+            search.best_move(*positions[0], 2)
+            seconds = nodes = differ = 0
+            for (own, opp), result in zip(positions, expected):
+                start = time.perf_counter()
+                differ += search.best_move(own, opp, depth) != result
+                seconds += time.perf_counter() - start
+                nodes += search.nodes
+        rows.append((workers, seconds, nodes, differ))
+    return rows
+
+def endgame_times(size, empties, count, seed=0):
+    """ Solves count positions with each number of empty squares exactly.
+    Returns rows of (empty squares, nodes, seconds) with a list entry per
+    position. """
+    rows = []
+    for empty in empties:
+        nodes, seconds = [], []
+        for own, opp in midgame_positions(size, count, size**2 - 4 - empty, seed):
+            solver = EndgameSolver(size)
+            start = time.perf_counter()
+            solver.solve(own, opp)
+            seconds.append(time.perf_counter() - start)
+            nodes.append(solver.nodes)
+        rows.append((empty, nodes, seconds))
+    return rows
+
+def numbers(value):
+    return [float(item) for item in value.split(",")]
+
+def integers(value):
+    return [int(item) for item in value.split(",")]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks the reversi search")
+    commands = parser.add_subparsers(dest="command")
+
+    pruning = commands.add_parser("pruning", help="nodes alpha-beta visits against "
+                                                  "minimax on mid-game positions (the default)")
+    pruning.add_argument("--size", type=int, default=8)
+    pruning.add_argument("--depths", type=integers, default=[2, 3, 4],
+                         help="comma separated search depths (default: 2,3,4)")
+    pruning.add_argument("--positions", type=int, default=10)
+    pruning.add_argument("--plies", type=int, default=20,
+                         help="random moves played to reach each position (default: 20)")
+    pruning.add_argument("--seed", type=int, default=0)
+
+    table = commands.add_parser("table", help="transposition table sizes against "
+                                              "searching without one")
+    table.add_argument("--size", type=int, default=8)
+    table.add_argument("--depth", type=int, default=5)
+    table.add_argument("--table-sizes", type=integers, default=[0, 1024, 16384, 262144],
+                       help="comma separated numbers of slots, 0 for no table "
+                            "(default: 0,1024,16384,262144)")
+    table.add_argument("--positions", type=int, default=10)
+    table.add_argument("--plies", type=int, default=20)
+    table.add_argument("--seed", type=int, default=0)
+
+    latency = commands.add_parser("latency", help="depth reached and time taken by "
+                                                  "time-budgeted searches")
+    latency.add_argument("--size", type=int, default=8)
+    latency.add_argument("--budgets", type=numbers, default=[0.1, 0.5, 1.0],
+                         help="comma separated seconds per move (default: 0.1,0.5,1)")
+    latency.add_argument("--phases", type=integers, default=[4, 20, 40],
+                         help="comma separated random plies played before searching "
+                              "(default: 4,20,40)")
+    latency.add_argument("--positions", type=int, default=5)
+    latency.add_argument("--seed", type=int, default=0)
+
+    parallel = commands.add_parser("parallel", help="speedup of searching the root "
+                                                    "moves over worker processes")
+    parallel.add_argument("--size", type=int, default=8)
+    parallel.add_argument("--depth", type=int, default=6)
+    parallel.add_argument("--workers", type=integers, default=[1, 2, 4, 8],
+                          help="comma separated numbers of worker processes "
+                               "(default: 1,2,4,8)")
+    parallel.add_argument("--positions", type=int, default=5)
+    parallel.add_argument("--plies", type=int, default=20)
+    parallel.add_argument("--seed", type=int, default=0)
+
+    endgame = commands.add_parser("endgame", help="time to solve positions exactly "
+                                                  "by empty squares left")
+    endgame.add_argument("--size", type=int, default=8)
+    endgame.add_argument("--empties", type=integers, default=[6, 8, 10, 12],
+                         help="comma separated numbers of empty squares (default: 6,8,10,12)")
+    endgame.add_argument("--positions", type=int, default=5)
+    endgame.add_argument("--budget", type=float, default=1.0,
+                         help="seconds to count solves within (default: 1)")
+    endgame.add_argument("--seed", type=int, default=0)
+
+    moves = commands.add_parser("moves", help="check the bitboard moves and flips against "
+                                              "the list based ones")
+    moves.add_argument("--sizes", type=integers, default=[4, 5, 6, 8],
+                       help="comma separated board sizes (default: 4,5,6,8)")
+    moves.add_argument("--positions", type=int, default=2000)
+    moves.add_argument("--seed", type=int, default=0)
+
+    if not argv or argv[0] not in commands.choices and argv[0] not in ("-h", "--help"):
+        argv = ["pruning"] + argv
+    return parser.parse_args(argv)
+
+def pruning_benchmark(args):
+    positions = midgame_positions(args.size, args.positions, args.plies, args.seed)
+
+    print("{:>5} {:>12} {:>12} {:>7} {:>11} {:>12} {:>7}".format(
+        "depth", "minimax", "alpha-beta", "ratio", "minimax s", "alpha-beta s", "differ"))
+    for depth, full, pruned, full_seconds, pruned_seconds, differ in compare_pruning(
+            positions, args.size, args.depths):
+        print("{:>5} {:>12} {:>12} {:>7.1f} {:>11.3f} {:>12.3f} {:>7}".format(
+            depth, full, pruned, full / pruned, full_seconds, pruned_seconds, differ))
+
+def show_stat(stats, name, spec="d"):
+    """ Formats stats[name] for a table, or - without a table to count it """
+    return "-" if name not in stats else format(stats[name], spec)
+
+def table_benchmark(args):
+    positions = midgame_positions(args.size, args.positions, args.plies, args.seed)
+
+    print("{:>8} {:>10} {:>8} {:>7} {:>9} {:>9} {:>6} {:>8} {:>8} {:>9} {:>10}".format(
+        "slots", "nodes", "seconds", "differ", "probes", "hits", "hit %",
+        "cutoffs", "used", "replaced", "KiB each"))
+    for row in compare_table_sizes(positions, args.size, args.depth, args.table_sizes):
+        stats = row["stats"]
+        print("{:>8} {:>10} {:>8.3f} {:>7} {:>9} {:>9} {:>6} {:>8} {:>8} {:>9} {:>10}".format(
+            row["table_size"], row["nodes"], row["seconds"], row["differ"],
+            show_stat(stats, "probes"), show_stat(stats, "hits"),
+            "-" if not stats else format(100 * stats["hit_rate"], ".1f"),
+            show_stat(stats, "cutoffs"), show_stat(stats, "used"),
+            show_stat(stats, "replacements"),
+            "-" if not stats else stats["bytes"] // 1024))
+
+def latency_benchmark(args):
+    print("{:>6} {:>7} {:>6} {:>6} {:>6} {:>10} {:>10}".format(
+        "plies", "budget", "min d", "med d", "max d", "median s", "max s"))
+    for plies, budget, depths, seconds in move_latency(
+            args.size, args.budgets, args.phases, args.positions, args.seed):
+        print("{:>6} {:>7.2f} {:>6} {:>6} {:>6} {:>10.3f} {:>10.3f}".format(
+            plies, budget, min(depths), statistics.median(depths), max(depths),
+            statistics.median(seconds), max(seconds)))
+
+def parallel_benchmark(args):
+    positions = midgame_positions(args.size, args.positions, args.plies, args.seed)
+
+    print("{} CPUs".format(os.cpu_count()))
+    print("{:>7} {:>9} {:>8} {:>10} {:>7}".format(
+        "workers", "seconds", "speedup", "nodes", "differ"))
+    rows = parallel_speedup(positions, args.size, args.depth, args.workers)
+    for workers, seconds, nodes, differ in rows:
+        print("{:>7} {:>9.3f} {:>8.2f} {:>10} {:>7}".format(
+            workers, seconds, rows[0][1] / seconds, nodes, differ))
+
+def endgame_benchmark(args):
+    print("{:>7} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+        "empties", "med nodes", "max nodes", "median s", "max s", "in budget"))
+    for empty, nodes, seconds in endgame_times(args.size, args.empties,
+                                               args.positions, args.seed):
+        print("{:>7} {:>10} {:>10} {:>10.3f} {:>10.3f} {:>9}".format(
+            empty, statistics.median(nodes), max(nodes), statistics.median(seconds),
+            max(seconds), "{}/{}".format(sum(s <= args.budget for s in seconds), len(seconds))))
+
+def moves_benchmark(args):
+    positions, checked, set_differ, move_differ, list_seconds, bitboard_seconds = \
+        compare_moves(random_boards(args.sizes, args.positions, args.seed))
+    print("{} positions, {} moves checked".format(positions, checked))
+    print("list based {:.3f}s, bitboards {:.3f}s".format(list_seconds, bitboard_seconds))
+    if set_differ or move_differ:
+        sys.exit("Differs from the list based moves: {} move sets, {} moves".format(
+            set_differ, move_differ))
+    print("Same move sets and boards as the list based moves")
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.command == "pruning":
+        pruning_benchmark(args)
+    elif args.command == "table":
+        table_benchmark(args)
+    elif args.command == "latency":
+        latency_benchmark(args)
+    elif args.command == "parallel":
+        parallel_benchmark(args)
+    elif args.command == "endgame":
+        endgame_benchmark(args)
+    elif args.command == "moves":
+        moves_benchmark(args)
+
+# Prevent running if imported as a module
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 import sys
 import math
+from contextlib import ExitStack
+from functools import partial
+
+from bitboard import (bitboard_after, bitboard_flips, bitboard_moves, bit_indices,
+                      has_unbracketed, popcount, size_deltas)
+from search import AlphaBeta, RootSplit
 
 USAGE_ERROR = """\
-Usage: python3 reversi <player1 TYPE> <player2 TYPE>
-TYPE is either human or minimax
+Usage: python3 reversi <player1 TYPE> <player2 TYPE> [SECONDS]
+TYPE is either human, minimax or parallel, which is minimax on every core
+SECONDS is how long minimax may think about each move, 1 by default
 """
 
+# Default seconds minimax_strategy may spend on a move
+MOVE_SECONDS = 1.0
+
 class IllegalMoveError(Exception):
     def __init__(self, player, i, board):
         super().__init__()
@@ -96,22 +106,19 @@ def find_bracket(i, player, delta, board):
             return i + delta
 
 def deltas(board):
-    size = board_size(board)
-
-    up, down, left, right = -size, size, -1, +1
-    up_left, up_right, down_left, down_right = -size-1, -size+1, size-1, size+1
-    return (up, down, left, right, up_right, up_left, down_right, down_left)
+    return size_deltas(board_size(board))
 
 def valid_moves(player, board):
-    """ Returns the set of valid moves for the given player.
-    Moves are tuples in the form of (x,y), e.g. (1,3) """
+    """ Returns the set of valid moves for the given player, as board
+    indices. The set also holds None when find_bracket finds no move for
+    some piece in some direction. """
 
-    moves = set()
-    positions = {i for i, piece in enumerate(board) if piece == player}
+    size = board_size(board)
+    own, opp = bitboards(player, board)
 
-    for p in positions:
-        moves_for_p = {find_bracket(p, player, d, board) for d in deltas(board)}
-        moves = moves.union(moves_for_p)
+    moves = set(bit_indices(bitboard_moves(own, opp, size)))
+    if has_unbracketed(own, opp, size):
+        moves.add(None)
 
     return moves
 
@@ -131,12 +138,15 @@ def make_move(player, x, y, board):
     board = list(board)
 
     i = tuple_as_index((x, y), board)
-    if i in valid_moves(player, board):
-        for d in deltas(board):
-            board = make_flips(i, player, d, board)
-    else:
+    flips = 0
+    if 0 <= i < len(board) and board[i] == EMPTY_SQUARE:
+        flips = bitboard_flips(i, *bitboards(player, board), board_size(board))
+    if not flips:
         raise IllegalMoveError(player, i, board)
 
+    for j in bit_indices(flips | 1 << i):
+        board[j] = player
+
     return board
 
 def dangerously_make_move(player, x, y, board):
@@ -149,6 +159,17 @@ def dangerously_make_move(player, x, y, board):
 def player_score(player, board):
     return len([piece for piece in board if piece == player])
 
+def bitboards(player, board):
+    """ Returns (own, opponent) bitboards for player """
+    other = opponent(player)
+    own = opp = 0
+    for i, piece in enumerate(board):
+        if piece == player:
+            own |= 1 << i
+        elif piece == other:
+            opp |= 1 << i
+    return own, opp
+
 # Strategies
 
 def human_strategy(player, board):
@@ -180,63 +201,100 @@ def human_strategy(player, board):
 # Minimax
 
 def minimax(player, board, depth):
-    moves = valid_moves(player, board)
-    def value(board):
-        return -minimax(opponent(player), board, depth - 1)[0]
+    own, opp = bitboards(player, board)
+    return bitboard_minimax(own, opp, board_size(board), depth)
 
+def bitboard_minimax(own, opp, size, depth):
+    """ Negamax on bitboards. Returns (value, move) for the player owning
+    own, where value is their piece count at the leaves and ties go to the
+    highest move index. """
     if depth == 0:
-        return player_score(player, board), None
-
-    if moves == {None}:
-        return player_score(player, board), None
-
-    moves.remove(None)
-
-    return max((value(make_move(player,
-                                index_as_tuple(m, board)[0],
-                                index_as_tuple(m, board)[1],
-                                board)), m) for m in moves)
-
-def minimax_strategy(player, board):
-    move = minimax(player, board, 4)
-    board = make_move(board, move[0], move[1], board)
-    return board
-
-def player_strategy_from_argv(i):
-    """ Parses argv at the given index and returns strategy for user """
+        return popcount(own), None
+
+    moves = bitboard_moves(own, opp, size)
+    if not moves:
+        return popcount(own), None
+
+    def value(i):
+        return -bitboard_minimax(*bitboard_after(i, own, opp, size), size, depth - 1)[0]
+
+    return max((value(i), i) for i in bit_indices(moves))
+
+def alphabeta(player, board, depth):
+    """ Same result as minimax, searched with AlphaBeta """
+    own, opp = bitboards(player, board)
+    return AlphaBeta(board_size(board)).best_move(own, opp, depth)
+
+def minimax_strategy(player, board, seconds=MOVE_SECONDS, search=None):
+    """ Plays the move of the deepest search finished within seconds.
+    search is the AlphaBeta, or RootSplit to search in parallel, to use.
+    Passing the same one for every move of a player keeps its tables,
+    killers and history, and a RootSplit's worker processes, between
+    moves. With ENDGAME_EMPTIES empty squares or fewer, plays perfectly if
+    the game can be solved in time. """
+    if search is None:
+        search = AlphaBeta(board_size(board))
+    own, opp = bitboards(player, board)
+    move = search.iterative_deepening(own, opp, seconds)[1]
+    x, y = index_as_tuple(move, board)
+    return make_move(player, x, y, board)
+
+def player_strategy_from_argv(i, size, searches, seconds=MOVE_SECONDS):
+    """ Parses argv at the given index and returns strategy for user.
+    Minimax gets seconds to think about each move on a board of size, with
+    a search kept for the whole game. A parallel search's workers are
+    stopped when the searches ExitStack closes. """
 
     # Ensure we don't look out of range
-    if len(sys.argv) < i:
+    if len(sys.argv) <= i:
         sys.exit(USAGE_ERROR)
 
     if sys.argv[i].lower() == "human":
         return human_strategy
     elif sys.argv[i].lower() == "minimax":
-        return minimax_strategy
+        return partial(minimax_strategy, seconds=seconds, search=AlphaBeta(size))
+    elif sys.argv[i].lower() == "parallel":
+        search = searches.enter_context(RootSplit(size))
+        return partial(minimax_strategy, seconds=seconds, search=search)
     else:
         sys.exit(USAGE_ERROR)
 
+def move_seconds_from_argv(i):
+    """ Parses the optional seconds per move at the given index of argv """
+
+    if len(sys.argv) <= i:
+        return MOVE_SECONDS
+
+    try:
+        seconds = float(sys.argv[i])
+    except ValueError:
+        sys.exit(USAGE_ERROR)
+    if seconds <= 0:
+        sys.exit(USAGE_ERROR)
+    return seconds
+
 # Main
 
 def main():
-    player1_strat = player_strategy_from_argv(1)
-    player2_strat = player_strategy_from_argv(2)
+    seconds = move_seconds_from_argv(3)
+    board = create_board(4)
 
-    strategy = lambda p: player1_strat if p == Player.ONE else player2_strat
+    with ExitStack() as searches:
+        player1_strat = player_strategy_from_argv(1, board_size(board), searches, seconds)
+        player2_strat = player_strategy_from_argv(2, board_size(board), searches, seconds)
 
-    current_player = Player.ONE
+        strategy = lambda p: player1_strat if p == Player.ONE else player2_strat
 
-    board = create_board(4)
+        current_player = Player.ONE
 
-    while valid_moves(current_player, board) != {None}:
-        print()
-        print("Player 1 score: {}".format(player_score(Player.ONE, board)))
-        print("Player 2 score: {}".format(player_score(Player.TWO, board)))
-        print_board(board)
-        print("Player {}'s turn:".format(current_player))
-        print(minimax(current_player, board, 1))
-        board = strategy(current_player)(current_player, board)
-        current_player = opponent(current_player)
+        while valid_moves(current_player, board) != {None}:
+            print()
+            print("Player 1 score: {}".format(player_score(Player.ONE, board)))
+            print("Player 2 score: {}".format(player_score(Player.TWO, board)))
+            print_board(board)
+            print("Player {}'s turn:".format(current_player))
+            board = strategy(current_player)(current_player, board)
+            current_player = opponent(current_player)
 
     print_board(board)
     print("No more moves are possible, game over!")
@@ -0,0 +1,607 @@
+""" Alpha-beta, parallel and exact endgame searches of reversi bitboards """
+import os
+import sys
+import math
+import time
+import random
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import bitboard_after, bitboard_flips, bitboard_moves, bit_indices, popcount
+
+# Time-budgeted searches try to solve the game exactly from this many
+# empty squares on
+ENDGAME_EMPTIES = 10
+
+@lru_cache(maxsize=None)
+def square_weights(size):
+    """ Static value of every square, used to order moves: corners can
+    never be flipped back, the squares next to them give corners away, and
+    edges are safer than the middle """
+    def weight(x, y):
+        edge_x, edge_y = min(x, size - 1 - x), min(y, size - 1 - y)
+        if edge_x == edge_y == 0:
+            return 100
+        if edge_x <= 1 and edge_y <= 1:
+            return -50 if edge_x == edge_y else -20
+        if edge_x == 0 or edge_y == 0:
+            return 10
+        if edge_x == 1 or edge_y == 1:
+            return -5
+        return 1
+    return tuple(weight(i % size, i // size) for i in range(size**2))
+
+@lru_cache(maxsize=None)
+def zobrist_keys(size):
+    """ Returns (piece keys, flip keys, side key) for Zobrist hashing.
+    piece_keys[color][i] is the key of a piece of color (0 or 1) at index
+    i, and flip_keys[i] the key of flipping the piece there to the other
+    color. The keys are seeded by the size, so they are the same on every
+    run. """
+    rng = random.Random(size)
+    piece_keys = tuple(tuple(rng.getrandbits(64) for _ in range(size**2)) for _ in range(2))
+    flip_keys = tuple(a ^ b for a, b in zip(*piece_keys))
+    return piece_keys, flip_keys, rng.getrandbits(64)
+
+def zobrist_hash(own, opp, size, color=0):
+    """ Hashes a position whose player to move has the pieces of color """
+    piece_keys, _, side_key = zobrist_keys(size)
+    key = side_key if color else 0
+    for i in bit_indices(own):
+        key ^= piece_keys[color][i]
+    for i in bit_indices(opp):
+        key ^= piece_keys[color ^ 1][i]
+    return key
+
+class TranspositionTable:
+    """ Fixed number of slots holding search results by Zobrist key.
+
+    Each slot holds one (key, depth, bound, value, move, age) entry, where
+    bound says whether value is exact or a lower or upper bound. A new entry
+    replaces one with a different key unless that one is from the current
+    search and was searched deeper, so expensive results stay while old
+    searches' results make way.
+
+    Attributes:
+        size: number of slots
+        age: number of searches started, to tell old entries apart
+        probes, hits: lookups, and those that found their key
+        cutoffs: hits whose value answered the search outright
+        stores, replacements, rejections: entries written, those that
+            overwrote another key, and those dropped to keep a deeper one
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size=2**16):
+        self.size = size
+        self.slots = [None] * size
+        self.age = 0
+        self.probes = self.hits = self.cutoffs = 0
+        self.stores = self.replacements = self.rejections = 0
+
+    def new_search(self):
+        self.age += 1
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, bound, value, move):
+        index = key % self.size
+        old = self.slots[index]
+        if old is not None and old[0] != key:
+            if old[5] == self.age and old[1] > depth:
+                self.rejections += 1
+                return
+            self.replacements += 1
+        self.slots[index] = (key, depth, bound, value, move, self.age)
+        self.stores += 1
+
+    def stats(self):
+        """ Counters as a dict, with the slots in use and roughly how many
+        bytes the table takes """
+        entries = [entry for entry in self.slots if entry is not None]
+        return {"size": self.size, "used": len(entries),
+                "probes": self.probes, "hits": self.hits,
+                "misses": self.probes - self.hits,
+                "hit_rate": self.hits / self.probes if self.probes else 0.0,
+                "cutoffs": self.cutoffs, "stores": self.stores,
+                "replacements": self.replacements, "rejections": self.rejections,
+                "bytes": sys.getsizeof(self.slots) + sum(
+                    sys.getsizeof(entry) + sys.getsizeof(entry[0]) for entry in entries)}
+
+class SearchTimeout(Exception):
+    """ Raised inside a search that ran past its deadline """
+
+class AlphaBeta:
+    """ Negamax with alpha-beta pruning on bitboards. Returns the same move
+    and value as bitboard_minimax at the same depth, visiting fewer nodes
+    the better its move ordering is.
+
+    Moves are tried best move from the transposition table first, then
+    killers, then by how often they caused a cutoff anywhere (history),
+    then by square_weights. Killers, history and the table carry over
+    between searches by the same instance.
+
+    The search plays moves in place on the position held by the instance,
+    with make and unmake, rather than building a new board or position for
+    every node. Every move adds a piece, so a
+    position can only be reached at one depth of a search; table values are
+    only reused at that same depth, which keeps results identical to
+    minimax.
+
+    Attributes:
+        size: length of one side of the board
+        nodes: positions visited by the last search
+        killers: maps remaining depth to the last two moves that caused a
+            cutoff there
+        history: for every square, the sum of depth squared over the
+            cutoffs moves there caused
+        table: TranspositionTable, or None when table_size is 0
+        own, opp, key, color: the position being searched, the player to
+            move first, its Zobrist key and the color of own's pieces
+        deadline: time.perf_counter() value after which searches raise
+            SearchTimeout, or None
+        endgame_empties: iterative_deepening tries solving positions with
+            this many empty squares or fewer exactly
+        endgame: the EndgameSolver it does that with, once it needs one
+    """
+
+    def __init__(self, size, table_size=2**16, endgame_empties=ENDGAME_EMPTIES):
+        self.size = size
+        self.weights = square_weights(size)
+        self.piece_keys, self.flip_keys, self.side_key = zobrist_keys(size)
+        self.nodes = 0
+        self.killers = {}
+        self.history = [0] * size**2
+        self.table = TranspositionTable(table_size) if table_size else None
+        self.deadline = None
+        self.own = self.opp = self.key = self.color = 0
+        self.endgame_empties = endgame_empties
+        self.endgame = None
+
+    def ordered_moves(self, moves, depth, hash_move=None):
+        killers = self.killers.get(depth, ())
+        history, weights = self.history, self.weights
+        return sorted(bit_indices(moves),
+                      key=lambda i: (i == hash_move, i in killers, history[i], weights[i]),
+                      reverse=True)
+
+    def cutoff(self, i, depth):
+        killers = self.killers.get(depth, ())
+        if i not in killers:
+            self.killers[depth] = (i,) + killers[:1]
+        self.history[i] += depth * depth
+
+    def make(self, i):
+        """ Plays the player to move's move to i, leaving the opponent to
+        move. Returns the pieces it flipped, for unmake. """
+        own, opp = self.own, self.opp
+        flips = bitboard_flips(i, own, opp, self.size)
+        key = self.key ^ self.piece_keys[self.color][i] ^ self.side_key
+        flip_keys = self.flip_keys
+        flipped = flips
+        while flipped:
+            low = flipped & -flipped
+            key ^= flip_keys[low.bit_length() - 1]
+            flipped ^= low
+        self.own, self.opp = opp & ~flips, own | flips | 1 << i
+        self.key, self.color = key, self.color ^ 1
+        return flips
+
+    def unmake(self, i, flips, key):
+        """ Takes back the move to i that flipped flips, restoring the
+        Zobrist key from before it """
+        own, opp = self.own, self.opp
+        self.own, self.opp = opp & ~(flips | 1 << i), own | flips
+        self.key, self.color = key, self.color ^ 1
+
+    def search(self, depth, alpha, beta):
+        """ Returns the value of the position for the player to move, exact
+        if it falls between alpha and beta, otherwise a bound on the far
+        side of whichever one it reaches """
+        self.nodes += 1
+        if (self.deadline is not None and not self.nodes & 1023
+                and time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+        own = self.own
+        if depth == 0:
+            return popcount(own)
+
+        moves = bitboard_moves(own, self.opp, self.size)
+        if not moves:
+            return popcount(own)
+
+        key = self.key
+        table = self.table
+        hash_move = None
+        if table is not None:
+            entry = table.probe(key)
+            if entry is not None:
+                _, entry_depth, bound, value, hash_move, _ = entry
+                if entry_depth == depth and (
+                        bound == TranspositionTable.EXACT
+                        or bound == TranspositionTable.LOWER and value >= beta
+                        or bound == TranspositionTable.UPPER and value <= alpha):
+                    table.cutoffs += 1
+                    return value
+
+        original_alpha = alpha
+        best, best_move = -math.inf, None
+        for i in self.ordered_moves(moves, depth, hash_move):
+            flips = self.make(i)
+            try:
+                value = -self.search(depth - 1, -beta, -alpha)
+            finally:
+                self.unmake(i, flips, key)
+            if value > best:
+                best, best_move = value, i
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.cutoff(i, depth)
+                        break
+
+        if table is not None:
+            if best <= original_alpha:
+                bound = TranspositionTable.UPPER
+            elif best >= beta:
+                bound = TranspositionTable.LOWER
+            else:
+                bound = TranspositionTable.EXACT
+            table.store(key, depth, bound, best, best_move)
+        return best
+
+    def set_position(self, own, opp):
+        """ Makes (own, opp) the position to search, with own to move """
+        self.own, self.opp, self.color = own, opp, 0
+        self.key = zobrist_hash(own, opp, self.size)
+
+    def root_moves(self, moves, depth, first_move=None):
+        """ Starts a search of the position to depth, returning its moves in
+        the order to try them. first_move goes first, otherwise the table's
+        best move. """
+        hash_move = first_move
+        if self.table is not None:
+            self.table.new_search()
+            entry = self.table.probe(self.key)
+            if hash_move is None and entry is not None:
+                hash_move = entry[4]
+        return self.ordered_moves(moves, depth, hash_move)
+
+    def move_value(self, i, depth, alpha):
+        """ Value of the move to i for the player to move, searched to
+        depth. Exact if more than alpha, otherwise at most alpha. """
+        key = self.key
+        flips = self.make(i)
+        try:
+            return -self.search(depth - 1, -math.inf, -alpha)
+        finally:
+            self.unmake(i, flips, key)
+
+    def best_move(self, own, opp, depth, first_move=None):
+        """ Returns (value, move) like bitboard_minimax. first_move is tried
+        first, before the table's best move. """
+        self.nodes = 1
+        moves = bitboard_moves(own, opp, self.size)
+        if depth == 0 or not moves:
+            return popcount(own), None
+
+        self.set_position(own, opp)
+        best = (-math.inf, None)
+        for i in self.root_moves(moves, depth, first_move):
+            value = self.move_value(i, depth, root_alpha(best, i))
+            if (value, i) > best:
+                best = (value, i)
+
+        if self.table is not None:
+            self.table.store(self.key, depth, TranspositionTable.EXACT, *best)
+        return best
+
+    def iterative_deepening(self, own, opp, seconds, max_depth=None):
+        """ Searches to depth 1, 2, ... until seconds have passed, max_depth
+        is reached or the depth covers every empty square. Returns (value,
+        move, depth) from the deepest search that finished, each of which
+        tries the previous one's best move first. Depth 1 always finishes,
+        so there is a move whenever there is one to make. Afterwards, nodes
+        counts the positions visited by every search, finished or not.
+
+        With endgame_empties or fewer empty squares, it first gives the
+        endgame solver half of seconds to solve the game exactly. If that
+        works, it returns the final piece difference, the move and the
+        number of empty squares instead; otherwise deepening gets the rest
+        of the time. """
+        start = time.perf_counter()
+        empty = self.size**2 - popcount(own | opp)
+        max_depth = empty if max_depth is None else min(max_depth, empty)
+
+        endgame_nodes = 0
+        if empty <= self.endgame_empties and bitboard_moves(own, opp, self.size):
+            if self.endgame is None:
+                self.endgame = EndgameSolver(self.size)
+            self.endgame.deadline = start + seconds / 2
+            try:
+                value, move = self.endgame.solve(own, opp)
+                self.nodes = self.endgame.nodes
+                return value, move, empty
+            except SearchTimeout:
+                endgame_nodes = self.endgame.nodes
+            finally:
+                self.endgame.deadline = None
+
+        value, move = self.best_move(own, opp, 1)
+        depth, nodes = 1, self.nodes + endgame_nodes
+        self.deadline = start + seconds
+        try:
+            while (depth < max_depth and move is not None
+                   and time.perf_counter() < self.deadline):
+                value, move = self.best_move(own, opp, depth + 1, move)
+                depth += 1
+                nodes += self.nodes
+        except SearchTimeout:
+            nodes += self.nodes
+        finally:
+            self.deadline = None
+            self.nodes = nodes
+        return value, move, depth
+
+def root_alpha(best, i):
+    """ Bound a root move to i has to beat to replace best, a (value, move)
+    pair. Minimax breaks ties towards the highest index, so a move after
+    the best one only has to match its value, and one before it has to beat
+    it. Values are piece counts, so matching is beating the value less one. """
+    value, move = best
+    if move is None or i < move:
+        return value
+    return value - 1
+
+class RootSplit(AlphaBeta):
+    """ AlphaBeta that searches the first of the root's moves itself, then
+    the rest over a pool of worker processes, one wave of as many moves as
+    there are workers at a time. Each wave is bounded by the best value of
+    the moves before it. Results are combined in move order rather than as
+    they finish, so the move and value are always the same as AlphaBeta's
+    at the same depth.
+
+    Close it, or use it in a with statement, to stop the workers.
+
+    Attributes:
+        workers: number of worker processes, one per CPU by default
+        executor: the ProcessPoolExecutor running them
+    """
+
+    def __init__(self, size, workers=None, table_size=2**16):
+        super().__init__(size, table_size)
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def best_move(self, own, opp, depth, first_move=None):
+        self.nodes = 1
+        moves = bitboard_moves(own, opp, self.size)
+        if depth == 0 or not moves:
+            return popcount(own), None
+
+        self.set_position(own, opp)
+        first, *rest = self.root_moves(moves, depth, first_move)
+        best = (self.move_value(first, depth, -math.inf), first)
+
+        # Workers can't compare perf_counter values with this process, so
+        # they get the deadline as a time.time() value
+        deadline = None
+        if self.deadline is not None:
+            deadline = time.time() + self.deadline - time.perf_counter()
+
+        for start in range(0, len(rest), self.workers):
+            wave, bound = rest[start:start + self.workers], best
+            futures = [self.executor.submit(worker_move_value, own, opp, self.size, depth,
+                                            i, root_alpha(bound, i), deadline)
+                       for i in wave]
+            try:
+                for i, future in zip(wave, futures):
+                    value, nodes = future.result()
+                    self.nodes += nodes
+                    if value is None:
+                        raise SearchTimeout()
+                    if (value, i) > best:
+                        best = (value, i)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        if self.table is not None:
+            self.table.store(self.key, depth, TranspositionTable.EXACT, *best)
+        return best
+
+@lru_cache(maxsize=None)
+def worker_search(size):
+    """ The AlphaBeta a RootSplit worker process searches with for a board
+    size, so its table, killers and history carry over between moves """
+    return AlphaBeta(size)
+
+def worker_move_value(own, opp, size, depth, i, alpha, deadline=None):
+    """ Runs in a RootSplit worker. Returns (value, nodes) for the move to
+    i, where value is None if the search ran past deadline, a time.time()
+    value. """
+    search = worker_search(size)
+    search.nodes = 0
+    search.set_position(own, opp)
+    if search.table is not None:
+        search.table.new_search()
+    if deadline is not None:
+        search.deadline = time.perf_counter() + deadline - time.time()
+    try:
+        value = search.move_value(i, depth, alpha)
+    except SearchTimeout:
+        value = None
+    finally:
+        search.deadline = None
+    return value, search.nodes
+
+# Endgame
+
+@lru_cache(maxsize=None)
+def parity_regions(size):
+    """ Returns, for every square, a bitboard of the quadrant it is in """
+    half = (size + 1) // 2
+    quadrants = {}
+    for i in range(size**2):
+        quadrant = (i % size < half, i // size < half)
+        quadrants[quadrant] = quadrants.get(quadrant, 0) | 1 << i
+    return tuple(quadrants[(i % size < half, i // size < half)] for i in range(size**2))
+
+class EndgameSolver:
+    """ Solves positions exactly, searching to the end of the game and
+    scoring it by the difference in pieces. A player without a move passes,
+    and the game ends when neither player can move.
+
+    Moves are tried best move from the table first, then those in a
+    quadrant with an odd number of empty squares (parity: the last move in
+    a region is worth having), then those leaving the opponent the fewest
+    replies (mobility) while more than mobility_empties squares are
+    empty, then by square_weights. Moves after the first are searched
+    with a null window first, which only tells whether they beat the best
+    so far, and searched again in full only when they do. Positions with
+    at least table_empties empty squares go in a small table of their own.
+
+    Attributes:
+        size: length of one side of the board
+        nodes: positions visited by the last solve
+        table: TranspositionTable of solved positions and bounds
+        deadline: time.perf_counter() value after which solving raises
+            SearchTimeout, or None
+    """
+
+    def __init__(self, size, table_size=2**14, table_empties=5, mobility_empties=6):
+        self.size = size
+        self.weights = square_weights(size)
+        self.regions = parity_regions(size)
+        self.table = TranspositionTable(table_size)
+        self.table_empties = table_empties
+        self.mobility_empties = mobility_empties
+        self.mask = (1 << size**2) - 1
+        self.nodes = 0
+        self.deadline = None
+
+    def children(self, own, opp, moves, empty, hash_move):
+        """ Returns (move, own, opp) for each move's position, from the
+        opponent's side, best first """
+        size, regions, weights = self.size, self.regions, self.weights
+        use_mobility = popcount(empty) > self.mobility_empties
+        children = []
+        for i in bit_indices(moves):
+            child_own, child_opp = bitboard_after(i, own, opp, size)
+            mobility = popcount(bitboard_moves(child_own, child_opp, size)) if use_mobility else 0
+            children.append((i == hash_move, popcount(empty & regions[i]) & 1, -mobility,
+                             weights[i], i, child_own, child_opp))
+        children.sort(reverse=True)
+        return [child[4:] for child in children]
+
+    def search(self, own, opp, alpha, beta, passed=False):
+        """ Returns the final piece difference for own with best play,
+        exact if it falls between alpha and beta, otherwise a bound on the
+        far side of whichever one it reaches. passed says the opponent
+        just passed. """
+        self.nodes += 1
+        if (self.deadline is not None and not self.nodes & 1023
+                and time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+
+        empty = self.mask & ~(own | opp)
+        if empty & (empty - 1) == 0:
+            return self.last_move(own, opp, empty)
+
+        moves = bitboard_moves(own, opp, self.size)
+        if not moves:
+            if passed:
+                return popcount(own) - popcount(opp)
+            return -self.search(opp, own, -beta, -alpha, True)
+
+        use_table = popcount(empty) >= self.table_empties
+        hash_move = None
+        if use_table:
+            # Tuple hashes of ints are the same on every run, and mix the
+            # bits much better than the table's modulo would on its own
+            key = hash((own, opp))
+            entry = self.table.probe(key)
+            if entry is not None:
+                _, _, bound, value, hash_move, _ = entry
+                if (bound == TranspositionTable.EXACT
+                        or bound == TranspositionTable.LOWER and value >= beta
+                        or bound == TranspositionTable.UPPER and value <= alpha):
+                    self.table.cutoffs += 1
+                    return value
+
+        original_alpha = alpha
+        best, best_move = -math.inf, None
+        for i, child_own, child_opp in self.children(own, opp, moves, empty, hash_move):
+            if best_move is None:
+                value = -self.search(child_own, child_opp, -beta, -alpha)
+            else:
+                value = -self.search(child_own, child_opp, -alpha - 1, -alpha)
+                if alpha < value < beta:
+                    value = -self.search(child_own, child_opp, -beta, -value)
+            if value > best:
+                best, best_move = value, i
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if use_table:
+            if best <= original_alpha:
+                bound = TranspositionTable.UPPER
+            elif best >= beta:
+                bound = TranspositionTable.LOWER
+            else:
+                bound = TranspositionTable.EXACT
+            self.table.store(key, popcount(empty), bound, best, best_move)
+        return best
+
+    def last_move(self, own, opp, empty):
+        """ Final piece difference for own with one or no empty square """
+        if empty:
+            i = empty.bit_length() - 1
+            flips = bitboard_flips(i, own, opp, self.size)
+            if flips:
+                return popcount(own) - popcount(opp) + 2 * popcount(flips) + 1
+            flips = bitboard_flips(i, opp, own, self.size)
+            if flips:
+                return popcount(own) - popcount(opp) - 2 * popcount(flips) - 1
+        return popcount(own) - popcount(opp)
+
+    def solve(self, own, opp):
+        """ Returns (final piece difference, best move) for own, where the
+        move is None if own has to pass """
+        self.nodes = 1
+        self.table.new_search()
+        moves = bitboard_moves(own, opp, self.size)
+        if not moves:
+            return -self.search(opp, own, -math.inf, math.inf, True), None
+
+        empty = self.mask & ~(own | opp)
+        best = (-math.inf, None)
+        alpha = -math.inf
+        for i, child_own, child_opp in self.children(own, opp, moves, empty, None):
+            if best[1] is None:
+                value = -self.search(child_own, child_opp, -math.inf, math.inf)
+            else:
+                value = -self.search(child_own, child_opp, -alpha - 1, -alpha)
+                if value > alpha:
+                    value = -self.search(child_own, child_opp, -math.inf, -value)
+            if value > best[0]:
+                best = (value, i)
+                alpha = value
+        return best
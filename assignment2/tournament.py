@@ -0,0 +1,195 @@
+""" Plays reversi engines against each other without a board on screen """
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import bitboard_after, bitboard_moves, bit_indices, popcount
+from reversi import Player, bitboards, create_board
+from search import ENDGAME_EMPTIES, AlphaBeta
+
+class Engine:
+    """ Plays one side of one game from a strategy spec:
+
+        random                  a random move
+        depth:N                 alpha-beta to N plies
+        minimax:SECONDS[:EMPTY] iterative deepening for SECONDS a move,
+                                like minimax_strategy, solving the game
+                                exactly from EMPTY empty squares on
+                                (default: ENDGAME_EMPTIES)
+
+    Searching engines keep one AlphaBeta for the whole game, so their
+    tables and history carry over between moves.
+
+    Attributes:
+        spec: the strategy spec
+        nodes: positions searched over the game
+        latencies: seconds taken by each move
+    """
+
+    def __init__(self, spec, size, rng):
+        name, _, argument = spec.partition(":")
+        if name not in ("random", "depth", "minimax"):
+            raise ValueError("unknown strategy {!r}".format(spec))
+        if name != "random" and not argument:
+            raise ValueError("strategy {!r} needs an argument, like {}:3".format(spec, name))
+        self.spec = spec
+        self.name = name
+        if name == "minimax":
+            seconds, _, empties = argument.partition(":")
+            self.argument = float(seconds)
+            self.search = AlphaBeta(size, endgame_empties=int(empties or ENDGAME_EMPTIES))
+        else:
+            self.argument = int(argument or 0)
+            if name == "depth" and self.argument < 1:
+                raise ValueError("strategy {!r} needs a depth of at least 1".format(spec))
+            self.search = AlphaBeta(size) if name == "depth" else None
+        self.rng = rng
+        self.nodes = 0
+        self.latencies = []
+
+    def choose(self, own, opp, moves):
+        """ Returns the index to move to, from the non-empty moves bitboard """
+        start = time.perf_counter()
+        if self.name == "random":
+            move = self.rng.choice(list(bit_indices(moves)))
+        elif self.name == "depth":
+            move = self.search.best_move(own, opp, self.argument)[1]
+            self.nodes += self.search.nodes
+        else:
+            move = self.search.iterative_deepening(own, opp, self.argument)[1]
+            self.nodes += self.search.nodes
+        self.latencies.append(time.perf_counter() - start)
+        return move
+
+def random_opening(size, plies, rng):
+    """ Returns (own, opponent, player to move) after plies random moves
+    from the starting position """
+    own, opp = bitboards(Player.ONE, create_board(size))
+    player = 0
+    for _ in range(plies):
+        moves = bitboard_moves(own, opp, size)
+        if not moves:
+            break
+        own, opp = bitboard_after(rng.choice(list(bit_indices(moves))), own, opp, size)
+        player ^= 1
+    return own, opp, player
+
+def play_game(specs, size, opening_plies, seed, game):
+    """ Plays one game between the two strategy specs and returns a JSON
+    serializable summary. Games come in pairs that share a random opening,
+    with the specs swapping colors, so neither gets the better side of an
+    opening. A player without moves passes, and the game ends when neither
+    can move. """
+    opening = random.Random("{}/{}".format(seed, game // 2))
+    own, opp, to_move = random_opening(size, opening_plies, opening)
+
+    # engines[0] plays the first color, Player.ONE
+    swap = game % 2
+    engines = [Engine(specs[swap ^ color], size,
+                      random.Random("{}/{}/{}".format(seed, game, color)))
+               for color in (0, 1)]
+
+    passes = 0
+    while passes < 2:
+        moves = bitboard_moves(own, opp, size)
+        if moves:
+            passes = 0
+            i = engines[to_move].choose(own, opp, moves)
+            own, opp = bitboard_after(i, own, opp, size)
+        else:
+            passes += 1
+            own, opp = opp, own
+        to_move ^= 1
+
+    # Pieces by color, then by spec
+    pieces = [popcount(own), popcount(opp)]
+    if to_move:
+        pieces.reverse()
+    pieces = [pieces[swap], pieces[swap ^ 1]]
+    engines = [engines[swap], engines[swap ^ 1]]
+
+    winner = None
+    if pieces[0] != pieces[1]:
+        winner = 0 if pieces[0] > pieces[1] else 1
+    return {"game": game, "winner": winner, "pieces": pieces,
+            "first": swap, "nodes": [engine.nodes for engine in engines],
+            "latencies": [engine.latencies for engine in engines]}
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of values, which must be sorted """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def summarize(specs, size, results, seconds):
+    """ Win rates, nodes per second and move latencies for each spec """
+    players = []
+    for side, spec in enumerate(specs):
+        latencies = sorted(latency for result in results for latency in result["latencies"][side])
+        nodes = sum(result["nodes"][side] for result in results)
+        wins = sum(result["winner"] == side for result in results)
+        losses = sum(result["winner"] == 1 - side for result in results)
+        players.append({
+            "strategy": spec, "wins": wins, "losses": losses,
+            "draws": len(results) - wins - losses,
+            "win_rate": wins / len(results) if results else None,
+            "pieces": sum(result["pieces"][side] for result in results) / max(len(results), 1),
+            "moves": len(latencies), "nodes": nodes,
+            "nodes_per_second": nodes / sum(latencies) if sum(latencies) else None,
+            "latency": {"mean": sum(latencies) / len(latencies) if latencies else None,
+                        "p50": percentile(latencies, 0.5), "p90": percentile(latencies, 0.9),
+                        "p99": percentile(latencies, 0.99),
+                        "max": latencies[-1] if latencies else None}})
+    return {"size": size, "games": len(results), "seconds": seconds,
+            "games_per_second": len(results) / seconds if seconds else None,
+            "players": players}
+
+def run_tournament(specs, games, size=8, opening_plies=4, seed=0, parallel=1):
+    """ Plays games between the two specs, over parallel worker processes
+    or in this process when parallel is 1, and returns the summary """
+    start = time.perf_counter()
+    jobs = [(specs, size, opening_plies, seed, game) for game in range(games)]
+    if parallel <= 1:
+        results = [play_game(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=parallel) as executor:
+            results = list(executor.map(play_game, *zip(*jobs)))
+    return summarize(specs, size, results, time.perf_counter() - start)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Plays reversi strategies against each other and prints JSON stats. "
+                    "Strategies are random, depth:N for alpha-beta to N plies, or "
+                    "minimax:SECONDS[:EMPTY] for a time budget per move, solving the "
+                    "game exactly from EMPTY empty squares on.")
+    parser.add_argument("strategies", nargs=2, metavar="strategy")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--opening-plies", type=int, default=4,
+                        help="random moves played before the strategies take over (default: 4)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parallel", type=int, default=os.cpu_count() or 1, metavar="N",
+                        help="worker processes to use (default: one per CPU)")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    try:
+        for spec in args.strategies:
+            Engine(spec, args.size, None)
+    except ValueError as error:
+        sys.exit("Error: {}".format(error))
+
+    summary = run_tournament(args.strategies, args.games, args.size,
+                             args.opening_plies, args.seed, args.parallel)
+    output = open(args.output, "w") if args.output else sys.stdout
+    output.write(json.dumps(summary, indent=2) + "\n")
+
+# Prevent running if imported as a module
+if __name__ == "__main__":
+    main()
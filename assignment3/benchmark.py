@@ -0,0 +1,84 @@
+""" Benchmarks parallel naive Bayes training and scoring """
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from lib import np, predict_parallel, train_parallel
+
+def corpus_file(filename, copies):
+    """ Writes copies of filename, one after another, to a temporary file
+    and returns its name """
+    text = open(filename).read()
+    if not text.endswith("\n"):
+        text += "\n"
+    corpus = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+    with corpus:
+        for _ in range(copies):
+            corpus.write(text)
+    return corpus.name
+
+def parallel_speedup(train_filename, test_filename, classes, worker_counts):
+    """ Trains on train_filename and scores test_filename with each number
+    of workers. Returns rows of (workers, training seconds, scoring seconds,
+    accuracy, whether the predictions match the first row's). """
+    rows = []
+    expected = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        counts = train_parallel(train_filename, classes, workers)
+        model = counts.model()
+        train_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        documents, predictions = predict_parallel(model, test_filename, workers)
+        score_seconds = time.perf_counter() - start
+
+        if expected is None:
+            expected = predictions
+        correct = sum(prediction == document[1]
+                      for prediction, document in zip(predictions, documents))
+        rows.append((workers, train_seconds, score_seconds,
+                     correct / len(documents), predictions == expected))
+    return rows
+
+def integers(value):
+    return [int(item) for item in value.split(",")]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Times training and scoring split over several numbers of worker "
+                    "processes, on copies of the bundled data sets")
+    parser.add_argument("--workers", type=integers,
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help="comma separated numbers of workers (default: 1,2,4 and the "
+                             "number of CPUs)")
+    parser.add_argument("--copies", type=int, default=200,
+                        help="copies of each data set to train and score (default: 200)")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if np is None:
+        sys.exit("Error: scoring needs numpy installed")
+
+    train_filename = corpus_file("trainingSet.txt", args.copies)
+    test_filename = corpus_file("testSet.txt", args.copies)
+    try:
+        print("{} CPUs, {} copies of each data set".format(os.cpu_count(), args.copies))
+        print("{:>7} {:>9} {:>9} {:>8} {:>9} {:>7}".format(
+            "workers", "train s", "score s", "speedup", "accuracy", "same"))
+        rows = parallel_speedup(train_filename, test_filename, [0, 1], args.workers)
+        for workers, train_seconds, score_seconds, accuracy, same in rows:
+            print("{:>7} {:>9.3f} {:>9.3f} {:>8.2f} {:>9.4f} {:>7}".format(
+                workers, train_seconds, score_seconds,
+                (rows[0][1] + rows[0][2]) / (train_seconds + score_seconds),
+                accuracy, "yes" if same else "no"))
+    finally:
+        os.remove(train_filename)
+        os.remove(test_filename)
+
+# Prevent running if imported as a module
+if __name__ == "__main__":
+    main()
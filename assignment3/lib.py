@@ -1,9 +1,17 @@
+import os
 import re
-from math import log
-from collections import defaultdict
+import locale
+from math import inf, log
+from functools import partial
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 non_alphanum = re.compile(r'[\W_]+')
-flatten = lambda l: [item for sublist in l for item in sublist]
 
 def process_word(word):
     return non_alphanum.sub('', word.lower())
@@ -11,66 +19,162 @@ def process_word(word):
 def process_document(document):
     """ Returns a tuple. The first element is the review split into array of words.
         The second element is an int indicating whether the review was positive. """
+    words = document.split()
     return (
-        [process_word(word) for word in document.split()][:-1],
-        int(document.split()[-1])
+        [process_word(word) for word in words[:-1]],
+        int(words[-1])
     )
 
+def read_documents(lines):
+    """ Yields each non-blank line processed by process_document, so a file
+        can be tokenized one line at a time """
+    for line in lines:
+        if line.strip():
+            yield process_document(line)
+
 def format_document(document, vocab):
+    """ Dense format: a 0 or 1 for every word in vocab, in vocab's order,
+        followed by the sentiment """
+    words = set(document[0])
     return (
-        ','.join(['1' if word in document[0] else '0' for word in vocab])
+        ','.join(['1' if word in words else '0' for word in vocab])
         + ',' + str(document[1])
     )
 
-def preprocess(infilename, outfilename):
+def format_sparse_document(document, vocab_index):
+    """ Sparse format: the sorted indices of the vocab words in the document,
+        followed by the sentiment, e.g. 3,17,250,1 """
+    indices = sorted({vocab_index[word] for word in document[0] if word in vocab_index})
+    return ','.join([str(i) for i in indices] + [str(document[1])])
+
+def preprocess(infilename, outfilename, dense=False):
     """ Returns a tuple in the form of (vocab, documents).
         Vocab: a set of words, e.g. { 'great', 'steak', 'gross', ... }
         Documents: a tuple containing the array of words in the document followed
         by the sentiment of the document, represented by a 1 or 0, e.g.
-        (['i', 'liked', 'the', 'food'], 1) """
+        (['i', 'liked', 'the', 'food'], 1)
+
+        The outfile starts with the sorted vocab on one line, then has a line
+        per document in the sparse format of format_sparse_document, or in the
+        dense format of format_document if dense is set. """
 
-    # Process input file
-    infile = open(infilename, 'r')
-    raw_documents = infile.read().splitlines()
-    documents = [process_document(document) for document in raw_documents]
-    vocab = {process_word(word) for document in raw_documents for word in document.split()[:-1]}
+    # Tokenize the input file and build the vocab in one pass
+    vocab = set()
+    documents = []
+    with open(infilename, 'r') as infile:
+        for document in read_documents(infile):
+            vocab.update(document[0])
+            documents.append(document)
     vocab.discard('')
-    infile.close()
 
-    # Format text for outfile and write
-    outfile = open(outfilename, 'w')
-    formatted_vocab = ','.join(sorted(list(vocab)))
-    formatted_documents = '\n'.join([format_document(document, vocab) for document in documents])
-    outfile.write(formatted_vocab + '\n' + formatted_documents)
-    outfile.close()
+    # Write the outfile one document at a time
+    sorted_vocab = sorted(vocab)
+    vocab_index = {word: i for i, word in enumerate(sorted_vocab)}
+    with open(outfilename, 'w') as outfile:
+        outfile.write(','.join(sorted_vocab))
+        for document in documents:
+            if dense:
+                outfile.write('\n' + format_document(document, sorted_vocab))
+            else:
+                outfile.write('\n' + format_sparse_document(document, vocab_index))
 
     return vocab, documents
 
-def train_naive_bayes(vocab, documents, classes):
+def log_tables(vocab, document_counts, word_counts, classes):
+    """ Returns a tuple in the form of (logprior, loglikelihood) from the
+        number of documents in each class and the count of each word in each
+        class, as train_naive_bayes does. A class without any documents gets
+        a log prior of -inf, so it is never predicted. Raises ValueError if
+        there are no documents at all. """
     logprior = {}
     loglikelihood = defaultdict(dict)
-    big_doc = {}
-
-    def get_logprior(documents, c):
-        class_document_count = len([doc for doc in documents if doc[1] == c])
-        total_document_count = len(documents)
-        return log(class_document_count / total_document_count)
-
-    def get_bigdoc(documents, c):
-        return flatten([doc[0] for doc in documents if doc[1] == c])
+    total_document_count = sum(document_counts.values())
+    if not total_document_count:
+        raise ValueError("no documents have been counted")
 
     for c in classes:
-        logprior[c] = get_logprior(documents, c)
-        big_doc[c] = get_bigdoc(documents, c)
-        words_in_class_count = sum([big_doc[c].count(w) for w in vocab])
+        if document_counts[c]:
+            logprior[c] = log(document_counts[c] / total_document_count)
+        else:
+            logprior[c] = -inf
+        # Words outside the vocab, like '', don't count towards the class
+        words_in_class_count = sum(word_counts[c][word] for word in vocab)
 
         for word in vocab:
-            word_count = big_doc[c].count(word)
+            word_count = word_counts[c][word]
             loglikelihood[word][c] = log((word_count + 1) /
                                          (words_in_class_count + 1))
 
     return logprior, loglikelihood
 
+def train_naive_bayes(vocab, documents, classes):
+    """ Returns a tuple in the form of (logprior, loglikelihood), where
+        logprior maps each class to its log prior and loglikelihood maps each
+        vocab word to the log likelihood of the word in each class.
+        Every document and word is counted in a single pass over documents. """
+    counts = NaiveBayesCounts(classes)
+    counts.update(documents)
+    return log_tables(vocab, counts.document_counts, counts.word_counts, classes)
+
+class NaiveBayesCounts:
+    """ The raw counts naive Bayes is trained from. Batches of new documents
+        are added with update, in time proportional to the batch, and counts
+        from separate shards are added together with merge. The log
+        probabilities are only recomputed when asked for after a change.
+        Classes that have no documents yet are never predicted, and asking
+        for the log probabilities before any document is counted raises
+        ValueError.
+
+    Attributes:
+        classes: the classes to compute log probabilities for
+        vocab: the set of every word counted, except ''
+        document_counts: maps each class to its number of documents
+        word_counts: maps each class to a Counter of its words
+    """
+
+    def __init__(self, classes):
+        self.classes = list(classes)
+        self.vocab = set()
+        self.document_counts = Counter()
+        self.word_counts = defaultdict(Counter)
+        self._tables = None
+        self._model = None
+
+    def update(self, documents):
+        """ Counts documents, as returned by preprocess or read_documents """
+        for words, c in documents:
+            self.document_counts[c] += 1
+            self.word_counts[c].update(words)
+            self.vocab.update(words)
+        self.vocab.discard('')
+        self._tables = self._model = None
+        return self
+
+    def merge(self, other):
+        """ Adds the counts of other, e.g. trained on another shard """
+        self.classes.extend([c for c in other.classes if c not in self.classes])
+        self.vocab |= other.vocab
+        self.document_counts.update(other.document_counts)
+        for c, counts in other.word_counts.items():
+            self.word_counts[c].update(counts)
+        self._tables = self._model = None
+        return self
+
+    def tables(self):
+        """ Returns (logprior, loglikelihood), the same as train_naive_bayes
+            on every document counted so far with vocab """
+        if self._tables is None:
+            self._tables = log_tables(self.vocab, self.document_counts,
+                                      self.word_counts, self.classes)
+        return self._tables
+
+    def model(self):
+        """ Returns a NaiveBayesModel of the tables. Needs numpy. """
+        if self._model is None:
+            logprior, loglikelihood = self.tables()
+            self._model = NaiveBayesModel(logprior, loglikelihood, self.classes, self.vocab)
+        return self._model
+
 def test_naive_bayes(document, logprior, loglikelihood, classes, vocab):
     # Filter words not in the vocab
     document = [word for word in document[0] if word in vocab]
@@ -82,3 +186,117 @@ def test_naive_bayes(document, logprior, loglikelihood, classes, vocab):
             prob[c] = prob[c] + loglikelihood[word][c]
 
     return max(prob.keys(), key=(lambda key: prob[key]))
+
+class NaiveBayesModel:
+    """ The tables from train_naive_bayes as NumPy arrays, for classifying
+        many documents at once. Needs numpy.
+
+    Attributes:
+        classes: the classes, in the order of the columns below
+        vocab: the sorted vocab, in the order of loglikelihood's rows
+        vocab_index: maps each vocab word to its row
+        logprior: array of each class's log prior
+        loglikelihood: |V| x |C| array of each word's log likelihood in each class
+    """
+
+    def __init__(self, logprior, loglikelihood, classes, vocab):
+        if np is None:
+            raise ImportError("NaiveBayesModel needs numpy installed")
+        self.classes = list(classes)
+        self.vocab = sorted(vocab)
+        self.vocab_index = {word: i for i, word in enumerate(self.vocab)}
+        self.logprior = np.array([logprior[c] for c in self.classes], dtype=float)
+        self.loglikelihood = np.empty((len(self.vocab), len(self.classes)))
+        for i, word in enumerate(self.vocab):
+            self.loglikelihood[i] = [loglikelihood[word][c] for c in self.classes]
+
+    def document_matrix(self, documents):
+        """ Returns the document-term matrix of documents in CSR form, as
+            (indptr, indices). Row d holds the vocab index of every word of
+            document d in order, repeated words included, so every entry is 1. """
+        indptr = [0]
+        indices = []
+        for document in documents:
+            indices.extend([self.vocab_index[word] for word in document[0]
+                            if word in self.vocab_index])
+            indptr.append(len(indices))
+        return np.array(indptr, dtype=np.intp), np.array(indices, dtype=np.intp)
+
+    def predict_batch(self, matrix):
+        """ Returns the most likely class of every row of a matrix from
+            document_matrix. The product with loglikelihood is accumulated in
+            each document's word order, so the scores, and ties between them,
+            come out exactly as in test_naive_bayes. """
+        indptr, indices = matrix
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        scores = np.tile(self.logprior, (len(indptr) - 1, 1))
+        np.add.at(scores, rows, self.loglikelihood[indices])
+        return [self.classes[i] for i in scores.argmax(axis=1)]
+
+    def predict(self, documents):
+        """ Returns the most likely class of each of documents """
+        return self.predict_batch(self.document_matrix(documents))
+
+def file_shards(filename, shards):
+    """ Splits filename into up to shards byte ranges (start, end) of about
+        the same size. A line belongs to the range its first byte is in. """
+    size = os.path.getsize(filename)
+    bounds = [size * i // shards for i in range(shards + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+def shard_lines(filename, shard):
+    """ Yields the lines of filename that start in the byte range shard,
+        decoded as open would decode them """
+    start, end = shard
+    encoding = locale.getpreferredencoding(False)
+    with open(filename, 'rb') as infile:
+        if start > 0:
+            # Skip the rest of the line started in the previous shard
+            infile.seek(start - 1)
+            infile.readline()
+        while infile.tell() < end:
+            line = infile.readline()
+            if not line:
+                break
+            yield line.decode(encoding)
+
+def count_shard(filename, classes, shard):
+    """ Returns the NaiveBayesCounts of the documents in shard of filename """
+    return NaiveBayesCounts(classes).update(read_documents(shard_lines(filename, shard)))
+
+def predict_shard(model, filename, shard):
+    """ Returns (documents, predictions) for the documents in shard of
+        filename, classified by model """
+    documents = list(read_documents(shard_lines(filename, shard)))
+    return documents, model.predict(documents)
+
+def map_shards(function, filename, workers):
+    """ Calls function on each of workers shards of filename, over a pool of
+        worker processes or in this process when workers is 1, and returns
+        the results in file order """
+    shards = file_shards(filename, max(workers, 1))
+    if workers <= 1:
+        return [function(shard) for shard in shards]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, shards))
+
+def train_parallel(infilename, classes, workers):
+    """ Returns the NaiveBayesCounts of infilename, tokenized and counted in
+        shards over workers processes. Its tables are the same as
+        train_naive_bayes on the output of preprocess. """
+    counts = NaiveBayesCounts(classes)
+    for shard_counts in map_shards(partial(count_shard, infilename, classes),
+                                   infilename, workers):
+        counts.merge(shard_counts)
+    return counts
+
+def predict_parallel(model, infilename, workers):
+    """ Returns (documents, predictions) for every document of infilename,
+        classified by model in shards over workers processes. Needs numpy. """
+    documents = []
+    predictions = []
+    for shard_documents, shard_predictions in map_shards(partial(predict_shard, model, infilename),
+                                                         infilename, workers):
+        documents.extend(shard_documents)
+        predictions.extend(shard_predictions)
+    return documents, predictions
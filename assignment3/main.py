@@ -1,5 +1,7 @@
 import sys
-from lib import preprocess, train_naive_bayes, test_naive_bayes
+import argparse
+from lib import (NaiveBayesModel, np, predict_parallel, preprocess, train_naive_bayes,
+                 train_parallel, test_naive_bayes)
 
 def print_test_results(results, test_docs):
     misclassified_docs = []
@@ -24,31 +26,61 @@ def print_test_results(results, test_docs):
     print("****************************************")
 
 def test(test_docs, prior, likelihood, classes, vocab):
-    results = []
-    for test_doc in test_docs:
-        results.append(test_naive_bayes(test_doc, prior, likelihood, classes, vocab))
-    print_test_results(results, test_documents)
+    if np is None:
+        results = []
+        for test_doc in test_docs:
+            results.append(test_naive_bayes(test_doc, prior, likelihood, classes, vocab))
+    else:
+        model = NaiveBayesModel(prior, likelihood, classes, vocab)
+        results = model.predict(test_docs)
+    print_test_results(results, test_docs)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Trains naive Bayes on trainingSet.txt and "
+                                                 "tests it on both data sets")
+    parser.add_argument("--dense", action="store_true",
+                        help="write the preprocessed files with a 0/1 column per vocab word "
+                             "instead of the sparse word indices")
+    parser.add_argument("--parallel", type=int, default=1, metavar="N",
+                        help="split each file into N shards and train and test over N "
+                             "worker processes. Needs numpy, and doesn't write the "
+                             "preprocessed files.")
+    return parser.parse_args(argv)
+
+def test_parallel(classes, workers):
+    counts = train_parallel('trainingSet.txt', classes, workers)
+    model = counts.model()
+
+    for title, filename in (("testing on training data", 'trainingSet.txt'),
+                            ("testing on testing data", 'testSet.txt')):
+        test_docs, results = predict_parallel(model, filename, workers)
+        print("\n")
+        print(title)
+        print_test_results(results, test_docs)
 
 # Prevent running if imported as a module
 if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
     classes = [0, 1]
-    # perform test on the training data
+    if args.parallel > 1 and np is None:
+        sys.exit("Error: --parallel needs numpy installed")
     sys.stdout = open('output.txt', 'wt')
-    vocab, documents = preprocess('trainingSet.txt', 'preprocessed_train.txt')
-    _, test_documents = preprocess('trainingSet.txt', 'preprocessed_train.txt')
 
-    prior, likelihood = train_naive_bayes(vocab, documents, classes)
+    if args.parallel > 1:
+        test_parallel(classes, args.parallel)
+    else:
+        # perform test on the training data
+        vocab, documents = preprocess('trainingSet.txt', 'preprocessed_train.txt', args.dense)
 
-    print("\n")
-    print("testing on training data")
-    test(documents, prior, likelihood, classes, vocab)
+        prior, likelihood = train_naive_bayes(vocab, documents, classes)
 
-    # perform test on the testing data
-    vocab, documents = preprocess('trainingSet.txt', 'preprocessed_train.txt')
-    _, test_documents = preprocess('testSet.txt', 'preprocessed_test.txt')
+        print("\n")
+        print("testing on training data")
+        test(documents, prior, likelihood, classes, vocab)
 
-    prior, likelihood = train_naive_bayes(vocab, documents, classes)
-    print("\n")
-    print("testing on testing data")
-    test(test_documents, prior, likelihood, classes, vocab)
+        # perform test on the testing data
+        _, test_documents = preprocess('testSet.txt', 'preprocessed_test.txt', args.dense)
 
+        print("\n")
+        print("testing on testing data")
+        test(test_documents, prior, likelihood, classes, vocab)